@@ -0,0 +1,63 @@
+# bench_preprocess.py
+# Compares docs/sec of text_utils.preprocess (one document at a time) with
+# preprocess_many on the BBC training texts, and checks that every variant
+# gives exactly the same output. Results are appended to a JSON file.
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import text_utils
+from run_history import append_run, git_revision
+
+
+def timed(func, texts):
+    start = time.perf_counter()
+    output = func(texts)
+    wall = time.perf_counter() - start
+    return output, {"wall_sec": round(wall, 3), "docs_per_sec": round(len(texts) / wall, 1) if wall else None}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark batch text preprocessing against preprocess.")
+    parser.add_argument("--data", default="data/bbc_news_train.csv")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the corpus to get a larger input.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Workers for the pooled run.")
+    parser.add_argument("--output", default="results/bench_preprocess.json", help="JSON file the run is appended to.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    texts = pd.read_csv(args.data)["Text"].fillna("").tolist() * args.repeat
+    text_utils.get_stop_words()
+
+    reference, baseline = timed(lambda docs: [text_utils.preprocess(doc) for doc in docs], texts)
+    runs = {"preprocess": baseline}
+    text_utils.cached_stem.cache_clear()
+    for name, processes in (("preprocess_many", 1), (f"preprocess_many_x{args.processes}", args.processes)):
+        output, stats = timed(lambda docs: text_utils.preprocess_many(docs, processes), texts)
+        stats["identical"] = output == reference
+        if baseline["wall_sec"] and stats["wall_sec"]:
+            stats["speedup"] = round(baseline["wall_sec"] / stats["wall_sec"], 2)
+        runs[name] = stats
+    for name, stats in runs.items():
+        print(f"{name}: {json.dumps(stats)}")
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "config": {**vars(args), "documents": len(texts)},
+        "runs": runs,
+    }
+    append_run(args.output, run)
+    print(f"Results appended to {args.output}")
+    if not all(stats.get("identical", True) for stats in runs.values()):
+        raise SystemExit("preprocess_many output differs from preprocess")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# bench_scraper.py
+# Measures crawler throughput against a local stand-in for bbc.co.uk, so runs
+# are reproducible and never touch the real site. Results are appended to a
+# JSON file to track regressions between versions.
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import scraper_news
+from crawl_control import CrawlController
+from html_cache import HtmlCache
+from run_history import append_run, git_revision
+
+WORDS = ("government minister said report climate police election market talks "
+         "company people country water border officials week years").split()
+
+
+def synthetic_listing(page, articles_per_page):
+    links = []
+    for i in range(articles_per_page):
+        css = "ssrcss-5wtq5v-PromoLink" if i % 2 else "ssrcss-9haqql-LinkPostLink"
+        links.append(f'<div><a class="{css}" href="/news/articles/p{page}a{i}">'
+                     f'<span role="text">Headline {page}-{i} about {WORDS[i % len(WORDS)]}</span></a></div>')
+    return f"<html><body><main>{''.join(links)}</main></body></html>"
+
+
+def synthetic_article(article_id, paragraphs, rng):
+    body = []
+    for i in range(paragraphs):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(40))
+        body.append(f'<p class="ssrcss-1q0x1qg-Paragraph e1jhz7w10">{sentence.capitalize()}.</p>')
+    body.append('<p class="ssrcss-1q0x1qg-Paragraph">Copyright 2025 BBC. All rights reserved.</p>')
+    return (f"<html><head><title>{article_id}</title></head><body><article>"
+            f'<time datetime="2025-05-29T00:40:27.000Z">29 May 2025</time>'
+            f"{''.join(body)}</article><footer>footer</footer></body></html>")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        config = self.server.config
+        if config["latency"]:
+            time.sleep(config["latency"])
+        if random.random() < config["error_rate"]:
+            self._send(503, "<html>Service unavailable</html>")
+            return
+
+        parsed = urlparse(self.path)
+        if parsed.path == "/news/world":
+            page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+            if page > config["pages"]:
+                self._send(200, "<html><body></body></html>")
+            else:
+                self._send(200, synthetic_listing(page, config["articles_per_page"]))
+        elif parsed.path.startswith("/news/articles/"):
+            article_id = parsed.path.rsplit("/", 1)[-1]
+            self._send(200, synthetic_article(article_id, config["paragraphs"], random.Random(article_id)))
+        else:
+            self._send(404, "<html>Not found</html>")
+
+    def _send(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(config):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class TimedFetcher(scraper_news.Fetcher):
+    # Records the latency of every request, retries included
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self._latency_lock = threading.Lock()
+
+    def get(self, url, headers=None):
+        start = time.perf_counter()
+        try:
+            return super().get(url, headers)
+        finally:
+            with self._latency_lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+# --no-pacing: no spacing between requests and short backoffs, to measure the crawler alone
+UNPACED_CONTROLLER = {"initial_interval": 0.0, "min_interval": 0.0, "backoff_base": 0.05, "cooldown": 1.0}
+
+
+def controller_settings(args):
+    # Production pacing unless --no-pacing
+    return dict(UNPACED_CONTROLLER) if args.no_pacing else {}
+
+
+def describe_controller(controller):
+    return {name: getattr(controller, name) for name in ("initial_interval", "min_interval", "max_interval",
+                                                         "target_latency", "max_retries", "backoff_base",
+                                                         "backoff_max", "cooldown")}
+
+
+def run_crawl(mode, args, cache):
+    controller = CrawlController(**controller_settings(args))
+    workers = 1 if mode == "serial" else args.workers
+    per_host = 1 if mode == "serial" else args.per_host
+    fetcher = TimedFetcher(workers, per_host, controller, cache)
+
+    tracemalloc.start()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if mode == "serial":
+        pages = scraper_news.crawl_serial(args.pages, fetcher=fetcher)
+    else:
+        pages = scraper_news.crawl_concurrent(args.pages, workers, per_host, fetcher=fetcher)
+    articles = sum(len(arts) for arts in pages)
+    wall = time.perf_counter() - start_wall
+    cpu = time.process_time() - start_cpu
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = fetcher.latencies
+    return {
+        "articles": articles,
+        "requests": len(latencies),
+        "wall_sec": round(wall, 3),
+        "cpu_sec": round(cpu, 3),
+        "pages_per_sec": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {f"p{q}": round(percentile(latencies, q) * 1000, 2) if latencies else None
+                       for q in (50, 95, 99)},
+        "peak_traced_mb": round(peak_traced / 2 ** 20, 2),
+        "retries": sum(host["retries"] for host in controller.stats().values()),
+    }
+
+
+def measure_parse(cache, parser):
+    pages = [cache.get(url) for url in cache.urls("article")]
+    start = time.process_time()
+    for page in pages:
+        scraper_news.extract_article(page, parser)
+    cpu = time.process_time() - start
+    return {
+        "articles": len(pages),
+        "cpu_sec": round(cpu, 3),
+        "articles_per_sec": round(len(pages) / cpu, 1) if cpu else None,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local stand-in BBC server.")
+    parser.add_argument("--pages", type=int, default=5, help="Listing pages served.")
+    parser.add_argument("--articles-per-page", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=25, help="Paragraphs per article, controls page size.")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Server-side delay added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses answered with 503.")
+    parser.add_argument("--workers", type=int, default=scraper_news.DEFAULT_WORKERS)
+    parser.add_argument("--per-host", type=int, default=scraper_news.DEFAULT_PER_HOST)
+    parser.add_argument("--modes", default="serial,concurrent", help="Comma-separated crawl modes to run.")
+    parser.add_argument("--no-pacing", action="store_true",
+                        help="Disable the crawl controller's request spacing (default: production pacing).")
+    parser.add_argument("--output", default="results/bench_scraper.json",
+                        help="JSON file the run is appended to.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = {
+        "pages": args.pages,
+        "articles_per_page": args.articles_per_page,
+        "paragraphs": args.paragraphs,
+        "latency": args.latency_ms / 1000,
+        "error_rate": args.error_rate,
+    }
+    server = start_server(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scraper_news.BASE_URL = base_url
+    scraper_news.SECTION_URL = base_url + "/news/world"
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "config": {**vars(args), "parser": scraper_news.PARSER,
+                   "controller": describe_controller(CrawlController(**controller_settings(args)))},
+        "crawl": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = None
+        for mode in args.modes.split(","):
+            cache = HtmlCache(os.path.join(tmp, mode))
+            run["crawl"][mode] = run_crawl(mode, args, cache)
+            print(f"{mode}: {json.dumps(run['crawl'][mode])}")
+        if cache is not None:
+            run["parse"] = {name: measure_parse(cache, name) for name in scraper_news.EXTRACTORS}
+            for name, stats in run["parse"].items():
+                print(f"parse {name}: {json.dumps(stats)}")
+    server.shutdown()
+    run["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    append_run(args.output, run)
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# crawl_control.py
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CONNECT_TIMEOUT = float(os.getenv("CRAWL_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("CRAWL_READ_TIMEOUT", 20))
+
+
+class _HostState:
+    def __init__(self, host, interval):
+        self.host = host
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.next_time = 0.0
+        self.latency = None
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+
+
+class CrawlController:
+    """Per-host pacing, timeouts, retries and circuit breaking for the crawler.
+
+    Requests to a host are spaced `interval` seconds apart. The interval shrinks
+    while responses are fast and healthy and grows when latency exceeds
+    `target_latency` or the host answers with 429/5xx, so the crawl settles at
+    the highest rate the server sustains. Retries use full-jitter exponential
+    backoff, honouring Retry-After. After `failure_threshold` consecutive
+    failures the host is left alone for `cooldown` seconds; a host that trips
+    `max_trips` times in a row without recovering is given up on.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 initial_interval=0.5, min_interval=0.05, max_interval=10.0,
+                 target_latency=1.0, failure_threshold=5, cooldown=60.0, max_trips=3):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_latency = target_latency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(host, self.initial_interval)
+            return state
+
+    def _wait_turn(self, state, retry):
+        # Reserve the next send slot for this host, then sleep until it comes up.
+        # Returns False when the host has been given up on.
+        with state.lock:
+            if state.trips >= self.max_trips:
+                return False
+            state.requests += 1
+            state.retries += retry
+            now = time.monotonic()
+            start = max(now, state.next_time, state.open_until)
+            state.next_time = start + state.interval
+        if start > now:
+            time.sleep(start - now)
+        return True
+
+    def _on_success(self, state, latency):
+        with state.lock:
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            state.failures = 0
+            state.trips = 0
+            if state.latency > self.target_latency:
+                state.interval = min(self.max_interval, state.interval * 1.5)
+            else:
+                state.interval = max(self.min_interval, state.interval * 0.9)
+
+    def _on_failure(self, state, delay=0.0):
+        with state.lock:
+            state.errors += 1
+            state.failures += 1
+            state.interval = min(self.max_interval, state.interval * 2)
+            now = time.monotonic()
+            if delay:
+                state.next_time = max(state.next_time, now + delay)
+            if state.failures >= self.failure_threshold:
+                state.failures = 0
+                state.trips += 1
+                state.open_until = now + self.cooldown
+                print(f"Too many failures from {state.host}, pausing it for {self.cooldown:.0f}s")
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return 0.0
+        try:
+            return min(self.backoff_max, max(0.0, float(value)))
+        except ValueError:
+            return 0.0
+
+    def request(self, session, url, headers=None):
+        """GETs `url`, retrying transient failures.
+
+        Returns the final response (which may still be an error status) or None
+        if no response could be obtained.
+        """
+        state = self._state(urlparse(url).netloc)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if not self._wait_turn(state, attempt > 0):
+                return response
+            started = time.monotonic()
+            try:
+                response = session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                print(f"Request to {url} failed: {e}")
+                self._on_failure(state)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                delay = self._retry_after(response)
+                self._on_failure(state, delay)
+                time.sleep(max(delay, self._backoff(attempt)))
+                continue
+
+            self._on_success(state, time.monotonic() - started)
+            return response
+        return response
+
+    def stats(self):
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            host: {
+                "requests": state.requests,
+                "retries": state.retries,
+                "errors": state.errors,
+                "interval": round(state.interval, 3),
+                "latency": None if state.latency is None else round(state.latency, 3),
+            }
+            for host, state in hosts.items()
+        }
@@ -0,0 +1,161 @@
+# embedding_cache.py
+import fcntl
+import hashlib
+import logging
+import os
+import re
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "results/cache/embeddings")
+EMBEDDING_CACHE_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", 500000))
+
+
+def sentence_key(model_name, sentence):
+    return hashlib.sha1(f"{model_name}\0{sentence}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Persistent sentence embeddings for one transformer model.
+
+    Vectors live in a memory-mapped float32 file with room for `max_items`
+    rows; index.npz maps sha1(model name + sentence) to a row and records when
+    each row was last used. When the file is full, the least recently used
+    tenth of the rows is recycled; a recycled row is only written again after
+    an index without its old key has been saved, so a crash never leaves a key
+    pointing at another sentence's vector.
+
+    One process at a time owns the cache through an exclusive lock on its
+    directory. Any other process (a second enrichment run, the service, a
+    streaming crawl) gets a pass-through instance that encodes everything
+    and stores nothing.
+    """
+
+    def __init__(self, model_name, root=EMBEDDING_CACHE_DIR, max_items=EMBEDDING_CACHE_MAX_ITEMS):
+        self.model_name = model_name
+        self.max_items = max_items
+        self.directory = os.path.join(root, re.sub(r"[^\w.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.npz")
+        self.hits = 0
+        self.misses = 0
+        self._slots = {}
+        self._vectors = None
+        self._dim = None
+        self._tick = 0
+        self._last_used = np.zeros(max_items, dtype=np.int64)
+        self._free = []
+        # Evicted rows, reusable once a saved index no longer references them
+        self._evicted = []
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.writable = True
+        except BlockingIOError:
+            self.writable = False
+            self._lock_file.close()
+            logging.warning(f"Embedding cache {self.directory} is in use by another process; encoding without it.")
+            return
+
+        if os.path.exists(self.index_path):
+            index = np.load(self.index_path)
+            if int(index["max_items"]) == max_items:
+                self._dim = int(index["dim"])
+                self._tick = int(index["tick"])
+                self._slots = {key.tobytes(): int(slot) for key, slot in zip(index["keys"], index["slots"])}
+                self._last_used = index["last_used"]
+                self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                          shape=(max_items, self._dim))
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(max_items - 1, -1, -1) if slot not in used]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _open(self, dim):
+        self._dim = dim
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+", shape=(self.max_items, dim))
+
+    def _evict(self):
+        # Recycle the least recently used 10% of the rows
+        count = max(1, self.max_items // 10)
+        slot_keys = {slot: key for key, slot in self._slots.items()}
+        for slot in np.argpartition(self._last_used, count - 1)[:count]:
+            key = slot_keys.get(int(slot))
+            if key is not None:
+                del self._slots[key]
+                self._evicted.append(int(slot))
+
+    def encode(self, transformer_model, sentences, batch_size=256):
+        """Embeddings of `sentences` as a float32 array, in input order.
+
+        Only sentences missing from the cache are sent to the transformer.
+        """
+        sentences = list(sentences)
+        if not self.writable:
+            self.misses += len(sentences)
+            return np.asarray(transformer_model.encode(sentences, batch_size=batch_size, convert_to_numpy=True,
+                                                       show_progress_bar=False), dtype=np.float32)
+        keys = [sentence_key(self.model_name, sentence) for sentence in sentences]
+        self._tick += 1
+
+        missing = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in self._slots and key not in missing:
+                missing[key] = sentence
+        self.misses += len(missing)
+        self.hits += len(sentences) - len(missing)
+
+        encoded = None
+        if missing:
+            encoded = transformer_model.encode(list(missing.values()), batch_size=batch_size,
+                                               convert_to_numpy=True, show_progress_bar=False)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            if self._vectors is None:
+                self._open(encoded.shape[1])
+        if self._dim is None:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Copy the hits out before inserting, since insertion may evict rows
+        fresh = dict(zip(missing, encoded)) if missing else {}
+        result = np.empty((len(sentences), self._dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in fresh:
+                result[i] = fresh[key]
+            else:
+                slot = self._slots[key]
+                result[i] = self._vectors[slot]
+                self._last_used[slot] = self._tick
+
+        for key, vector in fresh.items():
+            if not self._free:
+                if not self._evicted:
+                    self._evict()
+                # Drops the evicted keys from the saved index before their rows are overwritten
+                self.save()
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._slots[key] = slot
+            self._last_used[slot] = self._tick
+        return result
+
+    def save(self):
+        if not self.writable or self._vectors is None:
+            return
+        self._vectors.flush()
+        keys = np.frombuffer(b"".join(self._slots.keys()), dtype=np.uint8).reshape(-1, 20)
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        tmp_path = self.index_path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, slots=slots, last_used=self._last_used, tick=self._tick,
+                 dim=self._dim, max_items=self.max_items)
+        os.replace(tmp_path, self.index_path)
+        self._free.extend(self._evicted)
+        self._evicted = []
+
+    def close(self):
+        if self.writable:
+            self.save()
+            self._lock_file.close()
+            self.writable = False
@@ -0,0 +1,168 @@
+# enrich_service.py
+# Long-lived enrichment worker: loads every model once and serves enrichment
+# requests over local HTTP, so short jobs skip the cold start.
+#
+#   python enrich_service.py --port 8765
+#   curl -X POST localhost:8765/enrich -d '{"articles": [{"Headline": "...", "Body": "..."}]}'
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import requests
+
+import nlp_enriched_news
+
+SERVICE_URL = os.getenv("ENRICH_SERVICE_URL", "http://127.0.0.1:8765")
+
+
+class MicroBatcher:
+    """Groups articles from concurrent requests into one enrichment batch.
+
+    A batch is run as soon as `batch_size` articles are waiting or `max_wait`
+    seconds after the oldest waiting request arrived. Each request gets back
+    exactly its own rows.
+    """
+
+    def __init__(self, batch_size=64, max_wait=0.05):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, name="enrich-batcher", daemon=True).start()
+
+    def submit(self, records):
+        future = Future()
+        self._requests.put((records, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._requests.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._process(pending)
+
+    def _process(self, pending):
+        try:
+            frames = [pd.DataFrame(records) for records, _ in pending]
+            df = pd.concat(frames, ignore_index=True)
+            for column in ("Headline", "Body"):
+                if column not in df:
+                    df[column] = ""
+            df = nlp_enriched_news.enrich_articles(nlp_enriched_news.prepare_articles(df))
+            rows = json.loads(nlp_enriched_news.output_columns(df).to_json(orient="records", date_format="iso"))
+        except Exception as e:
+            logging.exception("Enrichment batch failed")
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        start = 0
+        for records, future in pending:
+            future.set_result(rows[start:start + len(records)])
+            start += len(records)
+
+
+def valid_records(records):
+    # A list of article objects whose Headline and Body, when given, are strings or null
+    return isinstance(records, list) and all(
+        isinstance(record, dict)
+        and all(isinstance(record.get(column), (str, type(None))) for column in ("Headline", "Body"))
+        for record in records)
+
+
+class EnrichHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/enrich":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            records = payload["articles"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": 'expected JSON body {"articles": [...]}'})
+            return
+        # Checked here: a malformed request must not fail the batch it would share with others
+        if not valid_records(records):
+            self._send_json(400, {"error": "articles must be a list of objects with string Headline and Body"})
+            return
+        if not records:
+            self._send_json(200, {"articles": []})
+            return
+        try:
+            rows = self.server.batcher.submit(records).result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"articles": rows})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def enrich_remote(records, url=SERVICE_URL, timeout=600):
+    # Client side: enriches article dicts (Headline, Body, ...) on a running service
+    r = requests.post(f"{url}/enrich", json={"articles": records}, timeout=timeout)
+    r.raise_for_status()
+    return r.json()["articles"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve article enrichment from a warm, long-lived process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-size", type=int, default=64, help="Articles per enrichment micro-batch.")
+    parser.add_argument("--max-wait", type=float, default=0.05,
+                        help="Seconds to wait for more requests before running a batch.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    nlp_enriched_news.warm_up()
+    logging.info(f"Models loaded in {time.time() - start_time:.2f} sec.")
+
+    server = ThreadingHTTPServer((args.host, args.port), EnrichHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(args.batch_size, args.max_wait)
+    logging.info(f"Enrichment service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# feature_cache.py
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+from scipy.sparse import load_npz, save_npz
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+
+from kv_cache import KVCache
+from text_utils import preprocess_many
+
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "results/cache/features")
+PREPROCESS_CACHE_PATH = os.getenv("PREPROCESS_CACHE_PATH", "results/cache/preprocessed.sqlite")
+# Size the feature cache is pruned back to after a training run
+FEATURE_CACHE_MAX_MB = float(os.getenv("FEATURE_CACHE_MAX_MB", 256))
+
+
+def documents_key(documents, salt=""):
+    # Order-sensitive hash of a list of documents
+    digest = hashlib.sha1(salt.encode("utf-8"))
+    for document in documents:
+        digest.update(hashlib.sha1(document.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def preprocess_cached(texts, cache=None):
+    """preprocess_many, with results kept by text hash so each text is preprocessed once."""
+    texts = list(texts)
+    cache = cache or KVCache(PREPROCESS_CACHE_PATH, table="preprocessed")
+    keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    found = cache.get_many(keys)
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        fresh = dict(zip(missing, preprocess_many(list(missing.values()))))
+        cache.put_many(fresh)
+        found.update(fresh)
+    return [found[key] for key in keys]
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _save_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _directory_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prune_feature_cache(cache_dir=FEATURE_CACHE_DIR, max_mb=FEATURE_CACHE_MAX_MB):
+    """Deletes the least recently used fits until the cache holds at most `max_mb`.
+
+    Each fit is one directory, touched whenever it is reused, so the fits of
+    the final model outlive the fold-level ones of a search or learning curve.
+    Returns the number of megabytes freed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0.0
+    entries = [(entry.stat().st_mtime, entry.path, _directory_size(entry.path))
+               for entry in os.scandir(cache_dir) if entry.is_dir()]
+    total = sum(size for _, _, size in entries)
+    freed = 0
+    for _, path, size in sorted(entries):
+        if total - freed <= max_mb * 2 ** 20:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        freed += size
+    return freed / 2 ** 20
+
+
+def clear_feature_cache(cache_dir=FEATURE_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+class CachedVectorizer(TransformerMixin, BaseEstimator):
+    """Wraps a text vectorizer (e.g. TfidfVectorizer) so that fits and outputs are reused.
+
+    A fit is keyed by the vectorizer's parameters and the exact training
+    documents. Its vocabulary (JSON), IDF weights (.npy) and the matrix of
+    every document list it transforms (.npz) are kept under `cache_dir`, so
+    refitting on the same data, e.g. the same cross-validation fold, only
+    loads files. Safe to share between the processes of a parallel
+    learning curve or search. `vectorizer_` is the plain fitted vectorizer,
+    for pipelines that are saved and used without the cache.
+    """
+
+    def __init__(self, vectorizer=None, cache_dir=FEATURE_CACHE_DIR):
+        self.vectorizer = vectorizer
+        self.cache_dir = cache_dir
+
+    def _directory(self):
+        return os.path.join(self.cache_dir, self.key_)
+
+    def _matrix_path(self, documents):
+        return os.path.join(self._directory(), documents_key(documents) + ".npz")
+
+    def _fit(self, documents):
+        params = json.dumps(self.vectorizer.get_params(), sort_keys=True, default=repr)
+        self.key_ = documents_key(documents, f"{type(self.vectorizer).__name__}\0{params}")
+        directory = self._directory()
+        vocabulary_path = os.path.join(directory, "vocabulary.json")
+        idf_path = os.path.join(directory, "idf.npy")
+        self.vectorizer_ = clone(self.vectorizer)
+
+        if os.path.exists(vocabulary_path):
+            # Marks the fit as recently used for prune_feature_cache
+            os.utime(directory)
+            with open(vocabulary_path, encoding="utf-8") as f:
+                self.vectorizer_.vocabulary_ = json.load(f)
+            if os.path.exists(idf_path):
+                self.vectorizer_.idf_ = np.load(idf_path)
+            matrix_path = self._matrix_path(documents)
+            return load_npz(matrix_path) if os.path.exists(matrix_path) else self.vectorizer_.transform(documents)
+
+        matrix = self.vectorizer_.fit_transform(documents)
+        os.makedirs(directory, exist_ok=True)
+        _save_atomic(self._matrix_path(documents), lambda path: save_npz(path, matrix))
+        if getattr(self.vectorizer_, "idf_", None) is not None:
+            _save_atomic(idf_path, lambda path: np.save(path, self.vectorizer_.idf_))
+        # Written last: its presence marks a complete entry
+        vocabulary = {term: int(index) for term, index in self.vectorizer_.vocabulary_.items()}
+        _save_atomic(vocabulary_path, lambda path: _write_json(path, vocabulary))
+        return matrix
+
+    def fit(self, X, y=None):
+        self._fit(list(X))
+        return self
+
+    def fit_transform(self, X, y=None):
+        return self._fit(list(X))
+
+    def transform(self, X):
+        documents = list(X)
+        matrix_path = self._matrix_path(documents)
+        if os.path.exists(matrix_path):
+            return load_npz(matrix_path)
+        matrix = self.vectorizer_.transform(documents)
+        os.makedirs(self._directory(), exist_ok=True)
+        _save_atomic(matrix_path, lambda path: save_npz(path, matrix))
+        return matrix
+
+    def get_feature_names_out(self, input_features=None):
+        return self.vectorizer_.get_feature_names_out()
@@ -0,0 +1,114 @@
+# html_cache.py
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+HTML_CACHE_DIR = os.getenv("HTML_CACHE_DIR", "data/html_cache")
+# Older versions of listing pages are dropped after this many days
+LISTING_MAX_AGE_DAYS = float(os.getenv("HTML_CACHE_LISTING_MAX_AGE_DAYS", 7))
+
+
+class HtmlCache:
+    """Compressed, content-addressed store of raw listing and article HTML.
+
+    Pages are stored once per distinct content, gzipped and named by their
+    sha256 under objects/. index.jsonl is an append-only log mapping each URL
+    to the hash of the HTML it returned, so the latest entry for a URL wins and
+    older versions stay available for comparison.
+    """
+
+    def __init__(self, root=HTML_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.jsonl")
+        self._lock = threading.Lock()
+        self._latest = {}
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._latest[entry["url"]] = entry
+
+    def __contains__(self, url):
+        return url in self._latest
+
+    def __len__(self):
+        return len(self._latest)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest + ".html.gz")
+
+    def path(self, url):
+        entry = self._latest.get(url)
+        return self._object_path(entry["sha256"]) if entry else None
+
+    def put(self, url, html, kind):
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, object_path)
+
+        entry = {"url": url, "sha256": digest, "kind": kind, "size": len(data),
+                 "fetched_at": datetime.utcnow().isoformat()}
+        with self._lock:
+            previous = self._latest.get(url)
+            if previous is None or previous["sha256"] != digest:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            self._latest[url] = entry
+        return digest
+
+    def get(self, url):
+        entry = self._latest.get(url)
+        if entry is None:
+            return None
+        with gzip.open(self._object_path(entry["sha256"]), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def prune_listings(self, max_age_days=LISTING_MAX_AGE_DAYS):
+        """Deletes listing page versions older than `max_age_days`, except each URL's latest.
+
+        Listing pages change on every crawl, so without this every run adds a
+        version of each of them. Article pages and the latest listing versions,
+        which offline re-parsing needs, are kept. Returns the number of
+        megabytes freed.
+        """
+        cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return 0.0
+            with open(self.index_path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            kept, dropped = [], []
+            for entry in entries:
+                stale = (entry["kind"] == "listing" and entry["fetched_at"] < cutoff
+                         and self._latest[entry["url"]]["sha256"] != entry["sha256"])
+                (dropped if stale else kept).append(entry)
+            if not dropped:
+                return 0.0
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in kept)
+            os.replace(tmp_path, self.index_path)
+
+        # Objects are shared by identical content, so only unreferenced ones go
+        referenced = {entry["sha256"] for entry in kept}
+        freed = 0
+        for digest in {entry["sha256"] for entry in dropped} - referenced:
+            object_path = self._object_path(digest)
+            if os.path.exists(object_path):
+                freed += os.path.getsize(object_path)
+                os.remove(object_path)
+        return freed / 2 ** 20
+
+    def urls(self, kind=None):
+        return [url for url, entry in self._latest.items() if kind is None or entry["kind"] == kind]
@@ -0,0 +1,54 @@
+# kv_cache.py
+import json
+import os
+import sqlite3
+import threading
+
+
+class KVCache:
+    """Persistent key/value store in a single SQLite file.
+
+    Keys are strings (usually content hashes), values anything JSON can hold;
+    floats round-trip exactly. Lookups and writes are batched, one query or
+    transaction per call. The connection is per thread, and SQLite's locking
+    (WAL mode) lets several processes share one file.
+    """
+
+    def __init__(self, path, table="cache"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get_many(self, keys, chunk_size=500):
+        # Found keys only, as a dict
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        conn = self._connection()
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", chunk)
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put_many(self, items):
+        rows = [(key, json.dumps(value)) for key, value in dict(items).items()]
+        if not rows:
+            return
+        with self._connection() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", rows)
@@ -0,0 +1,171 @@
+# near_dup.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+
+import numpy as np
+
+NEAR_DUP_INDEX_PATH = os.getenv("NEAR_DUP_INDEX_PATH", "results/near_dup.sqlite")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", 0.8))
+
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text, size=5):
+    # Overlapping word n-grams; short texts become a single shingle
+    tokens = re.findall(r"\w+", text.lower())
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def optimal_bands(threshold, num_perm, false_positive_weight=0.1, false_negative_weight=0.9):
+    """The (bands, rows) banding of a signature, with bands * rows <= num_perm.
+
+    Two articles with Jaccard similarity s share a bucket with probability
+    P(s) = 1 - (1 - s^r)^b. Like datasketch, this integrates the chance of a
+    false candidate (P below the threshold) and of a missed one (1 - P above
+    it) and minimises their weighted sum. Misses weigh more by default:
+    every candidate's similarity is checked anyway, so a false candidate
+    only costs a comparison, while a miss leaves a duplicate unlinked.
+    """
+    below = np.linspace(0.0, threshold, 201)
+    above = np.linspace(threshold, 1.0, 201)
+    best, best_error = None, np.inf
+    for b in range(1, num_perm + 1):
+        for r in range(1, num_perm // b + 1):
+            false_positive = np.mean(1 - (1 - below ** r) ** b) * threshold
+            false_negative = np.mean((1 - above ** r) ** b) * (1 - threshold)
+            error = false_positive_weight * false_positive + false_negative_weight * false_negative
+            if error < best_error:
+                best, best_error = (b, r), error
+    return best
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, `num_perm` uint32 values per text."""
+
+    def __init__(self, num_perm=128, shingle_size=5, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, _PRIME, num_perm).astype(np.uint64)[:, None]
+        self._b = rng.randint(0, _PRIME, num_perm).astype(np.uint64)[:, None]
+
+    def signature(self, text):
+        # None for texts without a single word
+        grams = set(shingles(text, self.shingle_size))
+        if not grams:
+            return None
+        x = np.fromiter((zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in grams), dtype=np.uint64,
+                        count=len(grams))
+        # Universal hashing (a*x + b) mod p stands in for a random permutation; a*x < 2^62
+        return ((self._a * x[None, :] + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+class NearDupIndex:
+    """Persistent MinHash LSH index linking near-duplicate articles to a canonical one.
+
+    Each article's signature is split into bands; canonical articles are filed
+    under a hash of every band, so candidates for a new article come from a
+    few indexed bucket lookups instead of a scan. A candidate counts as a
+    duplicate when the share of equal signature values (the estimated Jaccard
+    similarity of the shingle sets) reaches `threshold`. Duplicates are linked
+    to their candidate's canonical article and never become canonical
+    themselves. Unchanged articles (same content hash) are answered from the
+    stored link without hashing the text again.
+    """
+
+    def __init__(self, path=NEAR_DUP_INDEX_PATH, threshold=NEAR_DUP_THRESHOLD, num_perm=128, shingle_size=5):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS articles (article_id INTEGER PRIMARY KEY, "
+                              "content_hash TEXT NOT NULL, canonical_id INTEGER NOT NULL, signature BLOB)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                              "(band INTEGER NOT NULL, bucket INTEGER NOT NULL, article_id INTEGER NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS buckets_article ON buckets (article_id)")
+            self._check_layout()
+
+    def _check_layout(self):
+        # Signatures depend on num_perm and the shingle size, the buckets also on the banding
+        layout = {"num_perm": self.hasher.num_perm, "shingle_size": self.hasher.shingle_size, "bands": self.bands,
+                  "rows": self.rows}
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        stored = json.loads(row[0]) if row else None
+        if stored == layout:
+            return
+        if stored is not None and (stored["num_perm"], stored["shingle_size"]) != (layout["num_perm"],
+                                                                                   layout["shingle_size"]):
+            self.conn.execute("DELETE FROM articles")
+        self.conn.execute("DELETE FROM buckets")
+        canonical = self.conn.execute("SELECT article_id, signature FROM articles "
+                                      "WHERE article_id = canonical_id AND signature IS NOT NULL").fetchall()
+        for article_id, blob in canonical:
+            self._file(article_id, np.frombuffer(blob, dtype=np.uint32))
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (json.dumps(layout),))
+
+    def _band_keys(self, signature):
+        return [int.from_bytes(hashlib.blake2b(signature[i * self.rows:(i + 1) * self.rows].tobytes(),
+                                               digest_size=8).digest(), "big", signed=True)
+                for i in range(self.bands)]
+
+    def _file(self, article_id, signature):
+        self.conn.executemany("INSERT INTO buckets (band, bucket, article_id) VALUES (?, ?, ?)",
+                              [(band, key, article_id) for band, key in enumerate(self._band_keys(signature))])
+
+    def _best_match(self, article_id, signature):
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            rows = self.conn.execute("SELECT article_id FROM buckets WHERE band = ? AND bucket = ?", (band, key))
+            candidates.update(row[0] for row in rows)
+        candidates.discard(article_id)
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            canonical_id, blob = self.conn.execute("SELECT canonical_id, signature FROM articles "
+                                                   "WHERE article_id = ?", (candidate,)).fetchone()
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = canonical_id, similarity
+        return best_id
+
+    def canonical_id(self, article_id, content_hash, text):
+        """The article's canonical ID: its own unless it near-duplicates an indexed article."""
+        article_id = int(article_id)
+        row = self.conn.execute("SELECT content_hash, canonical_id FROM articles WHERE article_id = ?",
+                                (article_id,)).fetchone()
+        if row is not None and row[0] == content_hash:
+            return row[1]
+        if row is not None:
+            self.conn.execute("DELETE FROM buckets WHERE article_id = ?", (article_id,))
+
+        signature = self.hasher.signature(text)
+        canonical = article_id
+        if signature is not None:
+            match = self._best_match(article_id, signature)
+            if match is None:
+                self._file(article_id, signature)
+            else:
+                canonical = match
+        self.conn.execute("INSERT OR REPLACE INTO articles (article_id, content_hash, canonical_id, signature) "
+                          "VALUES (?, ?, ?, ?)",
+                          (article_id, content_hash, canonical, None if signature is None else signature.tobytes()))
+        return canonical
+
+    def canonical_ids(self, article_ids, content_hashes, texts):
+        # One transaction per batch; articles earlier in the batch are visible to later ones
+        with self.conn:
+            return [self.canonical_id(article_id, content_hash, text)
+                    for article_id, content_hash, text in zip(article_ids, content_hashes, texts)]
+
+    def close(self):
+        self.conn.close()
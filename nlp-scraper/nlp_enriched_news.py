@@ -1,18 +1,30 @@
 import os
 import time
+import argparse
+import hashlib
+import queue
 import logging
+import multiprocessing
+import tempfile
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import nltk
-import spacy
 import joblib
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 from collections import Counter
 from nltk.tokenize import sent_tokenize
-from nltk.sentiment import SentimentIntensityAnalyzer
-from sentence_transformers import SentenceTransformer, util
-from sklearn.feature_extraction.text import CountVectorizer 
-from text_utils import preprocess  
+from text_utils import PREPROCESS_PROCESSES, preprocess_many
+from embedding_cache import EmbeddingCache
+from kv_cache import KVCache
+from term_index import TERM_INDEX_PATH, TermIndex
+from near_dup import NEAR_DUP_INDEX_PATH, NEAR_DUP_THRESHOLD, NearDupIndex
+from vector_index import VECTOR_INDEX_DIR, VectorIndex, unit_rows
+from topic_artifact import TOPIC_ARTIFACT_DIR, TopicArtifact, artifact_matches
+from stage_dag import Stage, StageScheduler, parse_worker_counts
+from pipeline_metrics import METRICS_DIR, PipelineMetrics, stage_timer, timed_items
 
 # --- Logging setup ---
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
@@ -20,28 +32,19 @@ logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(m
 # --- Load environment variables ---
 load_dotenv()
 
-# --- Ensure required NLTK downloads ---
-nltk.download('vader_lexicon', quiet=True)
-nltk.download('punkt', quiet=True)
+# --- NER batching: documents per nlp.pipe batch and worker processes ---
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", 64))
+NER_PROCESSES = int(os.getenv("NER_PROCESSES", 1))
 
-# --- Load SpaCy model ---
-try:
-    nlp_spacy = spacy.load('en_core_web_sm')
-except:
-    import spacy.cli
-    spacy.cli.download('en_core_web_sm')
-    nlp_spacy = spacy.load('en_core_web_sm')
+# --- Sentences per transformer batch for the disaster score ---
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))
 
-# --- Load classification model ---
-model_path = os.getenv("TOPIC_MODEL_PATH", "results/topic_classifier.pkl")
-if not os.path.exists(model_path):
-    logging.error(f"Topic classifier model not found at {model_path}.")
-    exit(1)
+# --- Sentiment: worker processes for large batches, texts per task, score cache ---
+SENTIMENT_PROCESSES = int(os.getenv("SENTIMENT_PROCESSES", 1))
+SENTIMENT_CHUNK_SIZE = int(os.getenv("SENTIMENT_CHUNK_SIZE", 64))
+SENTIMENT_CACHE_PATH = os.getenv("SENTIMENT_CACHE_PATH", "results/cache/sentiment.sqlite")
 
-model = joblib.load(model_path)
-
-# --- Load embedding model ---
-sentence_transf_model = SentenceTransformer('all-MiniLM-L6-v2')
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 
 # --- Disaster keywords ---
 disaster_keywords = [
@@ -51,31 +54,186 @@ disaster_keywords = [
     "water depletion", "land degradation", "ecosystem destruction", "biodiversity loss",
     "marine pollution", "greenhouse gas emissions", "carbon footprint", "methane leak"
 ]
-keyword_embeddings = sentence_transf_model.encode(disaster_keywords, convert_to_tensor=True)
-logging.info("Disaster keyword embeddings prepared.")
 
-# --- Sentiment Analyzer ---
-sia = SentimentIntensityAnalyzer()
+# ---------- MODELS ----------
+# Loaded on first use, so importing this module stays cheap.
+
+@lru_cache(maxsize=None)
+def ensure_nltk_data():
+    nltk.download('vader_lexicon', quiet=True)
+    nltk.download('punkt', quiet=True)
+
+
+@lru_cache(maxsize=None)
+def get_spacy():
+    import spacy
+    try:
+        return spacy.load('en_core_web_sm')
+    except OSError:
+        import spacy.cli
+        spacy.cli.download('en_core_web_sm')
+        return spacy.load('en_core_web_sm')
+
+
+@lru_cache(maxsize=None)
+def get_topic_model():
+    model_path = os.getenv("TOPIC_MODEL_PATH", "results/topic_classifier.pkl")
+    # The memory-mapped artifact, but only if it was exported from this very pickle
+    if artifact_matches(model_path, TOPIC_ARTIFACT_DIR):
+        return TopicArtifact(TOPIC_ARTIFACT_DIR)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Topic classifier model not found at {model_path}.")
+    return joblib.load(model_path)
+
+
+@lru_cache(maxsize=None)
+def get_sentence_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache():
+    # Persistent sentence embedding cache, so reruns only encode new sentences
+    return EmbeddingCache(EMBEDDING_MODEL_NAME)
+
+
+def _in_main_process():
+    # Stage workers bypass the embedding cache; it is owned by one process at a time anyway
+    return multiprocessing.parent_process() is None
+
+
+@lru_cache(maxsize=None)
+def get_keyword_embeddings():
+    if _in_main_process():
+        embeddings = get_embedding_cache().encode(get_sentence_model(), disaster_keywords)
+    else:
+        embeddings = get_sentence_model().encode(disaster_keywords, convert_to_numpy=True, show_progress_bar=False)
+    logging.info("Disaster keyword embeddings prepared.")
+    return embeddings
+
+
+@lru_cache(maxsize=None)
+def get_sia():
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    ensure_nltk_data()
+    return SentimentIntensityAnalyzer()
+
+
+@lru_cache(maxsize=None)
+def get_sentiment_cache():
+    # Compound scores by text hash, so unchanged texts are never scored twice
+    return KVCache(SENTIMENT_CACHE_PATH, table="vader_compound")
+
+
+@lru_cache(maxsize=None)
+def get_sentiment_pool(processes):
+    return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def warm_up():
+    # Loads every model now instead of on the first article
+    ensure_nltk_data()
+    get_spacy()
+    get_topic_model()
+    get_keyword_embeddings()
+    get_sia()
+
 
 # ---------- FUNCTIONS ----------
 
 def analyze_sentiment(text):
     if not text.strip():
         return 0.0
-    return sia.polarity_scores(text)['compound']
+    return get_sia().polarity_scores(text)['compound']
+
+
+def _score_texts(texts):
+    return [analyze_sentiment(text) for text in texts]
+
+
+def analyze_sentiment_batch(texts, processes=SENTIMENT_PROCESSES, cache=None, chunk_size=SENTIMENT_CHUNK_SIZE):
+    """analyze_sentiment over many texts, with identical compound scores.
+
+    Scores already in `cache` (KVCache keyed by the sha1 of the text) are
+    reused; every other distinct text is scored once, in chunks spread over
+    `processes` worker processes when there is more than one chunk, and the
+    new scores are written back to the cache.
+    """
+    texts = list(texts)
+    keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    scores = cache.get_many(keys) if cache is not None else {}
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in scores and key not in missing:
+            missing[key] = text
+
+    if missing:
+        todo = list(missing.values())
+        if processes > 1 and len(todo) > chunk_size:
+            chunks = [todo[start:start + chunk_size] for start in range(0, len(todo), chunk_size)]
+            fresh = [score for chunk in get_sentiment_pool(processes).map(_score_texts, chunks) for score in chunk]
+        else:
+            fresh = _score_texts(todo)
+        fresh = dict(zip(missing, fresh))
+        if cache is not None:
+            cache.put_many(fresh)
+        scores.update(fresh)
+    return [scores[key] for key in keys]
+
+
+def _org_names(doc):
+    entities = [ent.text for ent in doc.ents if ent.label_ == 'ORG']
+    return ", ".join(list(Counter(entities)))
 
 
 def extract_entities(text):
     if not text.strip():
         return ""
-    doc = nlp_spacy(text[:1000000])
-    entities = [ent.text for ent in doc.ents if ent.label_ == 'ORG']
-    return ", ".join(list(Counter(entities)))
+    return _org_names(get_spacy()(text[:1000000]))
+
+
+# Components that never change entities. Everything else stays on: the parser and senter
+# set the sentence starts NER does not let entities cross, and rulers add entities themselves
+NON_ENTITY_COMPONENTS = {"tagger", "morphologizer", "attribute_ruler", "lemmatizer"}
+
+
+def _ner_disabled_components():
+    # Those components, and the shared tok2vec when none of the remaining ones listens to it
+    nlp_spacy = get_spacy()
+    disabled = [name for name in nlp_spacy.pipe_names if name in NON_ENTITY_COMPONENTS]
+    if "tok2vec" in nlp_spacy.pipe_names:
+        listeners = set(nlp_spacy.get_pipe("tok2vec").listening_components)
+        if not listeners - set(disabled):
+            disabled.append("tok2vec")
+    return disabled
+
+
+def extract_entities_batch(texts, batch_size=NER_BATCH_SIZE, n_process=NER_PROCESSES):
+    """extract_entities over many texts at once.
+
+    Documents are streamed through nlp.pipe in batches, optionally across
+    `n_process` worker processes, with the tagger, lemmatizer and other
+    components that cannot change entities disabled. The parser stays on for
+    the sentence boundaries entities are not allowed to cross. Returns the
+    same comma-joined ORG strings as extract_entities, in input order
+    (verified by --check-batch).
+    """
+    texts = list(texts)
+    results = [""] * len(texts)
+    todo = [i for i, text in enumerate(texts) if text.strip()]
+    docs = get_spacy().pipe((texts[i][:1000000] for i in todo), batch_size=batch_size,
+                          n_process=n_process, disable=_ner_disabled_components())
+    for doc, i in zip(timed_items(docs), todo):
+        results[i] = _org_names(doc)
+    return results
 
 
 def compute_disaster_similarity(text, keyword_embeddings, transformer_model, max_sentences=10):
+    from sentence_transformers import util
     if not text.strip():
         return 0.0
+    ensure_nltk_data()
     sentences = sent_tokenize(text)[:max_sentences]
     if not sentences:
         return 0.0
@@ -85,89 +243,517 @@ def compute_disaster_similarity(text, keyword_embeddings, transformer_model, max
     return max_sim_per_sentence.mean().item()
 
 
-# ---------- MAIN EXECUTION ----------
+def compute_disaster_scores(texts, keyword_embeddings, transformer_model, max_sentences=10,
+                            batch_size=EMBED_BATCH_SIZE, cache=None, return_embeddings=False):
+    """compute_disaster_similarity for a whole corpus in one pass.
+
+    The first `max_sentences` sentences of every text are flattened into one
+    list and encoded in large batches; cosine similarity against all keywords
+    is a single matrix product, and each article's score is the mean over its
+    sentences of the best keyword match. Empty texts score 0.0. With a `cache`
+    (EmbeddingCache) only sentences not encoded before reach the transformer.
+    With `return_embeddings` the article embeddings (unit mean of the sentence
+    embeddings, None for empty texts) are returned alongside the scores.
+    """
+    texts = list(texts)
+    ensure_nltk_data()
+    sentences = []
+    owners = []
+    for i, text in enumerate(texts):
+        if not text.strip():
+            continue
+        for sentence in sent_tokenize(text)[:max_sentences]:
+            sentences.append(sentence)
+            owners.append(i)
+
+    scores = np.zeros(len(texts))
+    if not sentences:
+        return (scores.tolist(), [None] * len(texts)) if return_embeddings else scores.tolist()
+
+    if hasattr(keyword_embeddings, "cpu"):
+        keyword_embeddings = keyword_embeddings.cpu().numpy()
+    if cache is not None:
+        sentence_embeddings = cache.encode(transformer_model, sentences, batch_size)
+    else:
+        sentence_embeddings = transformer_model.encode(sentences, batch_size=batch_size, convert_to_numpy=True,
+                                                       show_progress_bar=False)
+    sentence_embeddings = unit_rows(sentence_embeddings)
+    best_per_sentence = (sentence_embeddings @ unit_rows(keyword_embeddings).T).max(axis=1)
+
+    # Segmented mean: sentences of one article are contiguous in `owners`
+    owners = np.asarray(owners)
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    counts = np.diff(np.r_[starts, len(owners)])
+    scores[owners[starts]] = np.add.reduceat(best_per_sentence, starts) / counts
+    if not return_embeddings:
+        return scores.tolist()
+    embeddings = [None] * len(texts)
+    for i, vector in zip(owners[starts], unit_rows(np.add.reduceat(sentence_embeddings, starts, axis=0))):
+        embeddings[i] = vector
+    return scores.tolist(), embeddings
+
+
+def prepare_articles(df):
+    # --- Text cleanup ---
+    df["Headline"] = df["Headline"].fillna("")
+    df["Body"] = df["Body"].fillna("")
+    df["combined_text"] = df["Headline"] + " " + df["Body"]
+    df["Content_Hash"] = df["combined_text"].map(content_hash)
+    return df
 
-def main():
-    start_time = time.time()
-    logging.info("Starting NLP pipeline...")
 
-    # --- Connect to database ---
-    db_user = os.getenv("DB_USER")
-    db_pass = os.getenv("DB_PASSWORD")
-    db_host = os.getenv("DB_HOST")
-    db_name = os.getenv("DB_NAME")
+# --- Stage functions: a list of texts in, a list of results out ---
 
-    if not all([db_user, db_pass, db_host, db_name]):
-        logging.error("Missing DB credentials. Check your .env file.")
-        exit(1)
+def preprocess_texts(texts):
+    return preprocess_many(texts, PREPROCESS_PROCESSES if _in_main_process() else 1)
 
-    db_url = f"mysql+mysqlconnector://{db_user}:{db_pass}@{db_host}/{db_name}"
-    engine = create_engine(db_url)
 
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text("SELECT * FROM articles"), conn)
-        logging.info(f"Loaded {len(df)} articles from the database.")
-    except Exception as e:
-        logging.error(f"Database error: {e}")
-        exit(1)
+def sentiment_scores(texts):
+    # Stage workers score their shard themselves instead of starting another pool
+    processes = SENTIMENT_PROCESSES if _in_main_process() else 1
+    return analyze_sentiment_batch(texts, processes, get_sentiment_cache())
 
-    # --- Save raw data ---
-    os.makedirs("data", exist_ok=True)
-    df.to_csv("data/articles.csv", index=False)
-    logging.info("Saved raw data to data/articles.csv.")
 
-    # --- Text cleanup ---
-    df["Headline"] = df["Headline"].fillna("")
-    df["Body"] = df["Body"].fillna("")
-    df["combined_text"] = df["Headline"] + " " + df["Body"]
+def predict_topics(texts):
+    return list(get_topic_model().predict(texts))
 
-    # --- Remove duplicates ---
-    df = df.drop_duplicates(subset=["combined_text"])
-    logging.info(f"After removing duplicates: {len(df)} articles.")
+
+def disaster_scores(texts):
+    # (score, article embedding) per text
+    cache = get_embedding_cache() if _in_main_process() else None
+    scores, embeddings = compute_disaster_scores(texts, get_keyword_embeddings(), get_sentence_model(),
+                                                 cache=cache, return_embeddings=True)
+    if cache is not None:
+        cache.save()
+        logging.info(f"Embedding cache: {cache.hits} cached / {cache.misses} encoded sentences so far.")
+    return list(zip(scores, embeddings))
+
+
+ENRICHMENT_STAGES = [
+    Stage("preprocess", preprocess_texts, "combined_text", "preprocessed_for_topics"),
+    Stage("ner", extract_entities_batch, "combined_text", "Org"),
+    Stage("sentiment", sentiment_scores, "combined_text", "Sentiment"),
+    Stage("topics", predict_topics, "preprocessed_for_topics", "Topics"),
+    Stage("disaster", disaster_scores, "combined_text", ("Disaster_Score", "Article_Embedding")),
+]
+
+
+def enrich_articles(df, scheduler=None, metrics=None):
+    # With a StageScheduler independent stages run concurrently (timed by the
+    # scheduler's own metrics); otherwise one after another
+    if scheduler is not None:
+        return scheduler.run(df)
 
     # --- Text preprocessing ---
-    df["preprocessed_for_topics"] = df["combined_text"].apply(preprocess)
+    with stage_timer(metrics, "preprocess", len(df)):
+        df["preprocessed_for_topics"] = preprocess_texts(df["combined_text"])
     logging.info("Text preprocessing complete.")
 
     # --- Extract organizations ---
-    df["Org"] = df["combined_text"].apply(extract_entities)
+    with stage_timer(metrics, "ner", len(df)):
+        df["Org"] = extract_entities_batch(df["combined_text"])
     logging.info("Named entities extracted.")
 
     # --- Sentiment analysis ---
-    df["Sentiment"] = df["combined_text"].apply(analyze_sentiment)
+    with stage_timer(metrics, "sentiment", len(df)):
+        df["Sentiment"] = sentiment_scores(df["combined_text"])
     logging.info("Sentiment analysis complete.")
 
     # --- Topic classification ---
-    df["Topics"] = model.predict(df["preprocessed_for_topics"])
+    with stage_timer(metrics, "topics", len(df)):
+        df["Topics"] = predict_topics(df["preprocessed_for_topics"])
     logging.info("Topic classification complete.")
 
     # --- Disaster score ---
-    df["Disaster_Score"] = df["combined_text"].apply(
-        lambda x: compute_disaster_similarity(x, keyword_embeddings, sentence_transf_model)
-    )
+    with stage_timer(metrics, "disaster", len(df)):
+        scored = disaster_scores(df["combined_text"])
+        df["Disaster_Score"] = [score for score, _ in scored]
+        df["Article_Embedding"] = [embedding for _, embedding in scored]
     logging.info("Disaster score computed.")
+    return df
+
+
+def output_columns(df):
+    return df.drop(['combined_text', 'preprocessed_for_topics', 'Content_Hash', 'Article_Embedding'], axis=1,
+                   errors='ignore')
+
+
+def linked_rows(duplicates):
+    # Near-duplicates as output rows: empty enrichment columns, Canonical_ID points to the enriched article
+    targets = [target for stage in ENRICHMENT_STAGES for target in stage.targets]
+    return duplicates.reindex(columns=[*duplicates.columns, *targets])
+
+
+# ---------- BATCH EQUIVALENCE ----------
+
+# Disaster scores of batched sentence embeddings differ from per-article ones in float32 rounding only
+DISASTER_TOLERANCE = 1e-5
+
+
+def check_batch_equivalence(texts):
+    """Compares every batched stage with the per-article function it replaced.
+
+    extract_entities_batch and analyze_sentiment_batch must give exactly the
+    output of extract_entities and analyze_sentiment; compute_disaster_scores
+    must stay within DISASTER_TOLERANCE of compute_disaster_similarity. No
+    cache is used, so both sides really compute. Prints the time of each side
+    and returns the number of differing articles per stage.
+    """
+    texts = list(texts)
+    keyword_embeddings, transformer_model = get_keyword_embeddings(), get_sentence_model()
+    checks = {
+        "ner": (lambda: extract_entities_batch(texts),
+                lambda: [extract_entities(text) for text in texts], 0.0),
+        "sentiment": (lambda: analyze_sentiment_batch(texts, SENTIMENT_PROCESSES),
+                      lambda: [analyze_sentiment(text) for text in texts], 0.0),
+        "disaster": (lambda: compute_disaster_scores(texts, keyword_embeddings, transformer_model),
+                     lambda: [compute_disaster_similarity(text, keyword_embeddings, transformer_model)
+                              for text in texts], DISASTER_TOLERANCE),
+    }
+    mismatches = {}
+    for name, (batched, single, tolerance) in checks.items():
+        start = time.perf_counter()
+        batch_output = batched()
+        batch_time = time.perf_counter() - start
+        start = time.perf_counter()
+        reference = single()
+        single_time = time.perf_counter() - start
+        if tolerance:
+            differs = [abs(a - b) > tolerance for a, b in zip(batch_output, reference)]
+        else:
+            differs = [a != b for a, b in zip(batch_output, reference)]
+        mismatches[name] = sum(differs)
+        print(f"{name}: batched {batch_time:.2f}s, per article {single_time:.2f}s, "
+              f"{mismatches[name]} of {len(texts)} articles differ")
+    return mismatches
+
+
+# ---------- INCREMENTAL ENRICHMENT ----------
+
+# Bump when a stage changes its output, so every article is enriched again
+ENRICHMENT_VERSION = "1"
+ENRICH_WRITE_BATCH = 500
+
+CREATE_ENRICHED_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS enriched_articles (
+        Unique_ID INT PRIMARY KEY,
+        Content_Hash CHAR(40) NOT NULL,
+        Preprocessed MEDIUMTEXT,
+        Org TEXT,
+        Sentiment DOUBLE,
+        Topics VARCHAR(64),
+        Disaster_Score DOUBLE,
+        Enriched_at DATETIME
+    ) CHARACTER SET utf8mb4
+""")
+
+UPSERT_ENRICHED = text("""
+    INSERT INTO enriched_articles
+        (Unique_ID, Content_Hash, Preprocessed, Org, Sentiment, Topics, Disaster_Score, Enriched_at)
+    VALUES (:id, :hash, :preprocessed, :org, :sentiment, :topics, :score, NOW())
+    ON DUPLICATE KEY UPDATE Content_Hash = VALUES(Content_Hash), Preprocessed = VALUES(Preprocessed),
+        Org = VALUES(Org), Sentiment = VALUES(Sentiment), Topics = VALUES(Topics),
+        Disaster_Score = VALUES(Disaster_Score), Enriched_at = VALUES(Enriched_at);
+""")
+
+
+def content_hash(text):
+    return hashlib.sha1(f"{ENRICHMENT_VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+
+def save_enriched(engine, df):
+    rows = [
+        {"id": int(row.Unique_ID), "hash": row.Content_Hash, "preprocessed": row.preprocessed_for_topics,
+         "org": row.Org, "sentiment": float(row.Sentiment), "topics": row.Topics,
+         "score": float(row.Disaster_Score)}
+        for row in df.itertuples(index=False)
+    ]
+    for start in range(0, len(rows), ENRICH_WRITE_BATCH):
+        with engine.begin() as conn:
+            conn.execute(UPSERT_ENRICHED, rows[start:start + ENRICH_WRITE_BATCH])
+
+
+def enrich_incremental(engine, df, scheduler=None, metrics=None):
+    """Enriches only articles that are new or whose text changed since the last run.
+
+    Every article's content hash is compared with the hash stored next to its
+    enriched fields in enriched_articles; only mismatches go through the NLP
+    stages and are upserted. The stored fields are then merged back, so the
+    returned frame has the same columns as a full run. Only the ID range of
+    `df` is read back, so this works per chunk as well.
+    """
+    id_range = {"lo": int(df["Unique_ID"].min()), "hi": int(df["Unique_ID"].max())}
+    with engine.begin() as conn:
+        conn.execute(CREATE_ENRICHED_TABLE)
+        stored = pd.read_sql(text("SELECT Unique_ID, Content_Hash FROM enriched_articles "
+                                  "WHERE Unique_ID BETWEEN :lo AND :hi"), conn, params=id_range)
+    stored_hashes = dict(zip(stored["Unique_ID"], stored["Content_Hash"]))
+    changed = [stored_hashes.get(uid) != digest for uid, digest in zip(df["Unique_ID"], df["Content_Hash"])]
+    pending = df[changed].copy()
+    logging.info(f"Incremental run: {len(pending)} of {len(df)} articles are new or changed.")
+
+    if len(pending):
+        pending = enrich_articles(pending, scheduler, metrics)
+        save_enriched(engine, pending)
+
+    with engine.connect() as conn:
+        enriched = pd.read_sql(text("SELECT Unique_ID, Preprocessed AS preprocessed_for_topics, Org, Sentiment, "
+                                    "Topics, Disaster_Score FROM enriched_articles "
+                                    "WHERE Unique_ID BETWEEN :lo AND :hi"), conn, params=id_range)
+    df = df.merge(enriched, on="Unique_ID", how="left")
+    # Embeddings are only kept for what was enriched now; the rest is already indexed
+    if len(pending):
+        df = df.merge(pending[["Unique_ID", "Article_Embedding"]], on="Unique_ID", how="left")
+    return df, len(pending)
+
+
+# ---------- STREAMING ----------
+
+STREAM_OUTPUT_PATH = "results/enhanced_news_stream.csv"
+
+
+def consume_stream(article_queue, batch_size=32, max_wait=2.0, output_path=STREAM_OUTPUT_PATH):
+    """Enriches articles arriving on `article_queue` in micro-batches.
+
+    Items are (URL, Date_scraped, Headline, Body) tuples as produced by the
+    scraper; None ends the stream. A batch is processed once `batch_size`
+    articles are waiting or `max_wait` seconds after its first article, and
+    its enriched rows are appended to `output_path` straight away. The queue
+    is bounded by the producer, so while a batch is being enriched the
+    crawler blocks instead of running ahead.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    total = 0
+    finished = False
+    while not finished:
+        item = article_queue.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = article_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            batch.append(item)
+
+        start_time = time.time()
+        df = prepare_articles(pd.DataFrame(batch, columns=["URL", "Date_scraped", "Headline", "Body"]))
+        df = enrich_articles(df.drop_duplicates(subset=["combined_text"]))
+        output_columns(df).to_csv(output_path, mode="a", index=False, header=not os.path.exists(output_path))
+        total += len(df)
+        logging.info(f"Enriched {len(df)} streamed articles in {time.time() - start_time:.2f} sec "
+                     f"({total} so far, {article_queue.qsize()} waiting).")
+    logging.info(f"Stream finished: {total} articles written to {output_path}.")
 
-    # --- Top words ---
-    vectorizer = CountVectorizer(max_features=1000)
-    bow_matrix = vectorizer.fit_transform(df["preprocessed_for_topics"])
-    word_counts = bow_matrix.sum(axis=0)
-    word_freq = [(word, word_counts[0, idx]) for word, idx in vectorizer.vocabulary_.items()]
-    top_words = sorted(word_freq, key=lambda x: x[1], reverse=True)[:10]
 
-    logging.info("Top 10 frequent words:")
-    for word, freq in top_words:
-        logging.info(f"{word}: {freq}")
+# ---------- MAIN EXECUTION ----------
+
+ARTICLE_COLUMNS = "Unique_ID, URL, Date_scraped, Headline, Body"
+RAW_OUTPUT_PATH = "data/articles.csv"
+OUTPUT_PATH = "results/enhanced_news.csv"
+
+
+def read_articles(engine, chunk_size=None):
+    # Yields the articles table as DataFrames of at most `chunk_size` rows,
+    # paging on Unique_ID so no driver ever buffers more than one chunk;
+    # without a chunk size the whole table comes back as a single frame.
+    if not chunk_size:
+        with engine.connect() as conn:
+            yield pd.read_sql(text(f"SELECT {ARTICLE_COLUMNS} FROM articles"), conn)
+        return
+    last_id = None
+    while True:
+        query = f"SELECT {ARTICLE_COLUMNS} FROM articles"
+        params = {"limit": chunk_size}
+        if last_id is not None:
+            query += " WHERE Unique_ID > :last_id"
+            params["last_id"] = last_id
+        with engine.connect() as conn:
+            chunk = pd.read_sql(text(query + " ORDER BY Unique_ID LIMIT :limit"), conn, params=params)
+        if chunk.empty:
+            return
+        last_id = int(chunk["Unique_ID"].iloc[-1])
+        yield chunk
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enrich scraped articles with topics, sentiment, ORGs and disaster scores.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only enrich new or changed articles, keeping results in the enriched_articles table.")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("ENRICH_CHUNK_SIZE", 0)),
+                        help="Read and enrich the articles table in chunks of this many rows (0 reads it at once).")
+    parser.add_argument("--dump-raw", action="store_true",
+                        help=f"Also save the raw articles to {RAW_OUTPUT_PATH}.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run independent stages concurrently (see --stage-workers).")
+    parser.add_argument("--stage-workers", default=os.getenv("STAGE_WORKERS", ""),
+                        help="Worker processes per stage with --parallel, e.g. 'ner=4,sentiment=2,preprocess=2'.")
+    parser.add_argument("--near-dups", action="store_true",
+                        help="Link articles that near-duplicate an already indexed one (MinHash LSH) instead of "
+                             "enriching them; they are written with the Canonical_ID of that article.")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="Estimated Jaccard similarity of word 5-gram shingles above which articles are duplicates.")
+    parser.add_argument("--near-dup-index", default=NEAR_DUP_INDEX_PATH)
+    parser.add_argument("--vector-index", default=VECTOR_INDEX_DIR,
+                        help="Directory of the article embedding index used by vector_index.py searches.")
+    parser.add_argument("--term-index", default=TERM_INDEX_PATH,
+                        help="SQLite file with the per-day term counts behind the top words.")
+    parser.add_argument("--metrics-dir", default=METRICS_DIR,
+                        help="Where the per-stage JSON report and Prometheus text file are written.")
+    parser.add_argument("--profile-stage", choices=[stage.name for stage in ENRICHMENT_STAGES],
+                        help="Profile one stage (cProfile .prof, or py-spy flame graph with --profiler py-spy).")
+    parser.add_argument("--profiler", choices=["cprofile", "py-spy"], default="cprofile")
+    parser.add_argument("--check-batch", type=int, metavar="N",
+                        help="Check the batched NER, sentiment and disaster stages against the per-article "
+                             "functions on the first N articles and exit.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    logging.info("Starting NLP pipeline...")
+
+    # --- Connect to database ---
+    db_user = os.getenv("DB_USER")
+    db_pass = os.getenv("DB_PASSWORD")
+    db_host = os.getenv("DB_HOST")
+    db_name = os.getenv("DB_NAME")
+
+    if not all([db_user, db_pass, db_host, db_name]):
+        logging.error("Missing DB credentials. Check your .env file.")
+        exit(1)
+
+    db_url = f"mysql+mysqlconnector://{db_user}:{db_pass}@{db_host}/{db_name}"
+    engine = create_engine(db_url)
+
+    if args.check_batch:
+        sample = prepare_articles(next(read_articles(engine, args.check_batch)))
+        if any(check_batch_equivalence(sample["combined_text"]).values()):
+            raise SystemExit("Batched stages differ from the per-article functions")
+        return
+
+    metrics = PipelineMetrics(args.profile_stage, args.profiler, args.metrics_dir)
+    scheduler = None
+    if args.parallel:
+        scheduler = StageScheduler(ENRICHMENT_STAGES, parse_worker_counts(args.stage_workers), metrics=metrics)
 
-    # --- Save result ---
     os.makedirs("results", exist_ok=True)
-    df.drop(['combined_text', 'preprocessed_for_topics'], axis=1).to_csv("results/enhanced_news.csv", index=False)
-    logging.info("Final results saved to results/enhanced_news.csv.")
+    partial_path = OUTPUT_PATH + ".partial"
+    # Truncated up front, so nothing left by a crashed run is appended to
+    open(partial_path, "w").close()
+    written = False
+    # Content hashes seen in earlier chunks, on disk so memory does not grow with the archive
+    seen_dir = tempfile.TemporaryDirectory(prefix="enrich-", dir="results")
+    seen_hashes = KVCache(os.path.join(seen_dir.name, "seen.sqlite"), table="content_hashes")
+    term_index = TermIndex(args.term_index)
+    vector_index = VectorIndex(args.vector_index)
+    near_dups = NearDupIndex(args.near_dup_index, args.near_dup_threshold) if args.near_dups else None
+    linked = 0
+    loaded = kept = processed = 0
+    chunks = read_articles(engine, args.chunk_size)
+    while True:
+        try:
+            df = next(chunks, None)
+        except Exception as e:
+            logging.error(f"Database error: {e}")
+            exit(1)
+        if df is None:
+            break
+        first = loaded == 0
+        loaded += len(df)
+        logging.info(f"Loaded {len(df)} articles from the database ({loaded} so far).")
+
+        # --- Save raw data ---
+        if args.dump_raw:
+            os.makedirs("data", exist_ok=True)
+            df.to_csv(RAW_OUTPUT_PATH, index=False, mode="w" if first else "a", header=first)
+
+        df = prepare_articles(df)
+
+        # --- Remove duplicates, also against earlier chunks ---
+        df = df.drop_duplicates(subset=["Content_Hash"])
+        df = df[~df["Content_Hash"].isin(list(seen_hashes.get_many(df["Content_Hash"])))]
+        seen_hashes.put_many(zip(df["Content_Hash"], df["Unique_ID"].astype(int).tolist()))
+
+        # --- Link near-duplicates to their canonical article instead of enriching them ---
+        duplicates = df.iloc[:0]
+        if near_dups is not None and not df.empty:
+            df = df.assign(Canonical_ID=near_dups.canonical_ids(df["Unique_ID"], df["Content_Hash"],
+                                                                df["combined_text"]))
+            duplicate = (df["Unique_ID"] != df["Canonical_ID"]).to_numpy()
+            linked += int(duplicate.sum())
+            duplicates, df = df[duplicate], df[~duplicate]
+        kept += len(df)
+        if df.empty and duplicates.empty:
+            continue
+
+        if not df.empty:
+            if args.incremental:
+                df, pending = enrich_incremental(engine, df, scheduler, metrics)
+                processed += pending
+            else:
+                df = enrich_articles(df, scheduler, metrics)
+                processed += len(df)
+
+            # --- Term counts of new or changed articles ---
+            term_index.update(zip(df["Unique_ID"], df["Content_Hash"], df["Date_scraped"],
+                                  df["preprocessed_for_topics"]))
+
+            # --- Article embeddings for semantic search ---
+            if "Article_Embedding" in df:
+                embedded = df[df["Article_Embedding"].map(lambda vector: isinstance(vector, np.ndarray))]
+                if len(embedded):
+                    vector_index.add(embedded["Unique_ID"], np.stack(embedded["Article_Embedding"].tolist()))
+                    vector_index.save()
+
+        # --- Save result: enriched articles, then the near-duplicates linked to them ---
+        frames = [output_columns(frame) for frame in (df, linked_rows(duplicates)) if len(frame)]
+        pd.concat(frames, ignore_index=True).to_csv(partial_path, index=False, mode="a", header=not written)
+        written = True
+
+    if scheduler is not None:
+        scheduler.close()
+    seen_dir.cleanup()
+    if loaded == 0:
+        os.remove(partial_path)
+        logging.info("No articles in the database.")
+        return
+    if args.dump_raw:
+        logging.info(f"Saved raw data to {RAW_OUTPUT_PATH}.")
+    if near_dups is not None:
+        near_dups.close()
+        logging.info(f"Near-duplicates linked to a canonical article: {linked}.")
+    logging.info(f"After removing duplicates: {kept} articles.")
+
+    # --- Top words ---
+    for window, label in (("all", "all time"), ("7d", "last 7 days"), ("today", "today")):
+        logging.info(f"Top 10 frequent words ({label}):")
+        for word, freq in term_index.top_terms(10, window):
+            logging.info(f"{word}: {freq}")
+    term_index.close()
+
+    os.replace(partial_path, OUTPUT_PATH)
+    logging.info(f"Final results saved to {OUTPUT_PATH}.")
 
     # --- Final summary ---
     exec_time = time.time() - start_time
-    logging.info(f"Execution time: {exec_time:.2f} sec, processed {len(df)} articles "
-                 f"at {len(df)/exec_time:.2f} articles/sec.")
+    logging.info(f"Execution time: {exec_time:.2f} sec, processed {processed} articles "
+                 f"at {processed/exec_time:.2f} articles/sec.")
+    for name, stats in metrics.report()["stages"].items():
+        approximate = " (approximate, overlapped other stages)" if stats["cpu_overlapped_calls"] else ""
+        logging.info(f"Stage {name}: {stats['wall_sec']} sec wall, {stats['cpu_sec']} sec CPU{approximate}, "
+                     f"{stats['items_per_sec']} articles/sec, peak RSS {stats['peak_rss_mb']} MB.")
+    json_path, prom_path = metrics.write(args.metrics_dir)
+    logging.info(f"Stage metrics saved to {json_path} and {prom_path}.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+# online_topic_model.py
+# Incremental topic classifier: a stateless hashing vectorizer feeding a linear
+# model trained with partial_fit, so new labelled articles are learned batch by
+# batch instead of through a full retrain.
+#
+#   python online_topic_model.py data/bbc_news_train.csv      # bootstrap
+#   python online_topic_model.py data/labelled_2025_06.csv    # continues from the checkpoint
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import joblib
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.pipeline import Pipeline
+
+from feature_cache import preprocess_cached
+from run_history import append_run
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+
+ONLINE_MODEL_PATH = os.getenv("ONLINE_MODEL_PATH", "results/online_topic_classifier.pkl")
+BATCH_MODEL_PATH = os.getenv("TOPIC_MODEL_PATH", "results/topic_classifier.pkl")
+TEST_DATA_PATH = "data/bbc_news_tests.csv"
+REPORT_PATH = "results/online_topic_report.json"
+
+# partial_fit needs every class up front
+TOPIC_CLASSES = ["business", "entertainment", "politics", "sport", "tech"]
+
+
+def build_online_pipeline():
+    return Pipeline([
+        # Same unigrams and bigrams as the batch TF-IDF, hashed so there is no vocabulary to fit
+        ("hashing", HashingVectorizer(ngram_range=(1, 2), n_features=2 ** 20, alternate_sign=False, norm="l2")),
+        ("clf", SGDClassifier(loss="hinge", alpha=1e-4, random_state=0)),
+    ])
+
+
+class OnlineTopicModel:
+    """Topic classifier updated one labelled batch at a time.
+
+    The checkpoint is a plain sklearn Pipeline (usable as TOPIC_MODEL_PATH)
+    with a JSON file next to it counting the batches and documents learned so
+    far. Opening an existing checkpoint continues training from it.
+    """
+
+    def __init__(self, path=ONLINE_MODEL_PATH, classes=TOPIC_CLASSES):
+        self.path = path
+        self.meta_path = os.path.splitext(path)[0] + ".json"
+        self.classes = list(classes)
+        self.batches_seen = 0
+        self.documents_seen = 0
+        if os.path.exists(path):
+            self.pipeline = joblib.load(path)
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.batches_seen = meta["batches_seen"]
+            self.documents_seen = meta["documents_seen"]
+            self.classes = meta["classes"]
+        else:
+            self.pipeline = build_online_pipeline()
+
+    def partial_fit(self, texts, labels):
+        features = self.pipeline.named_steps["hashing"].transform(texts)
+        self.pipeline.named_steps["clf"].partial_fit(features, labels, classes=self.classes)
+        self.batches_seen += 1
+        self.documents_seen += len(texts)
+
+    def predict(self, texts):
+        return self.pipeline.predict(texts)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        joblib.dump(self.pipeline, tmp_path)
+        os.replace(tmp_path, self.path)
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"batches_seen": self.batches_seen, "documents_seen": self.documents_seen,
+                       "classes": self.classes, "saved_at": datetime.now().isoformat(timespec="seconds")}, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+
+def labelled_batches(paths, batch_size):
+    # Streams (texts, labels) batches from CSV files with Text and Category columns
+    for path in paths:
+        for chunk in pd.read_csv(path, usecols=["Text", "Category"], chunksize=batch_size):
+            chunk = chunk.dropna()
+            if len(chunk):
+                yield preprocess_cached(chunk["Text"]), chunk["Category"].tolist()
+
+
+def evaluate(model, test_path=TEST_DATA_PATH, batch_model_path=BATCH_MODEL_PATH):
+    df_test = pd.read_csv(test_path)
+    X_test = preprocess_cached(df_test["Text"])
+    y_test = df_test["Category"]
+    scores = {"online": accuracy_score(y_test, model.predict(X_test))}
+    if os.path.exists(batch_model_path):
+        scores["batch"] = accuracy_score(y_test, joblib.load(batch_model_path).predict(X_test))
+    return scores
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the topic classifier incrementally from labelled CSVs.")
+    parser.add_argument("csv", nargs="+", help="CSV files with Text and Category columns, learned in order.")
+    parser.add_argument("--batch-size", type=int, default=200, help="Articles per partial_fit call.")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="Save the model every N batches.")
+    parser.add_argument("--model", default=ONLINE_MODEL_PATH)
+    parser.add_argument("--test", default=TEST_DATA_PATH, help="Held-out CSV for the accuracy report.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    model = OnlineTopicModel(args.model)
+    if model.batches_seen:
+        logging.info(f"Continuing from {args.model}: {model.documents_seen} articles in {model.batches_seen} batches.")
+
+    start_time = time.time()
+    learned = 0
+    for batch, (texts, labels) in enumerate(labelled_batches(args.csv, args.batch_size), start=1):
+        model.partial_fit(texts, labels)
+        learned += len(texts)
+        if batch % args.checkpoint_every == 0:
+            model.save()
+            logging.info(f"Checkpoint after {model.documents_seen} articles saved to {args.model}.")
+    model.save()
+    logging.info(f"Learned {learned} new articles in {time.time() - start_time:.2f} sec; model saved to {args.model}.")
+
+    scores = evaluate(model, args.test)
+    for name, accuracy in scores.items():
+        logging.info(f"Test accuracy ({name} model): {accuracy:.4f}")
+
+    append_run(REPORT_PATH, {"timestamp": datetime.now().isoformat(timespec="seconds"), "sources": args.csv,
+                             "documents_seen": model.documents_seen, "accuracy": scores})
+    logging.info(f"Accuracy report appended to {REPORT_PATH}.")
+
+
+if __name__ == "__main__":
+    main()
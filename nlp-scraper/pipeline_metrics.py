@@ -0,0 +1,295 @@
+# pipeline_metrics.py
+import bisect
+import cProfile
+import json
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_DIR = os.getenv("METRICS_DIR", "results/metrics")
+
+# Seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL = float(os.getenv("RSS_SAMPLE_INTERVAL", 0.05))
+
+_active = threading.local()
+
+
+def _rss_high_water_bytes():
+    # Peak RSS of the process since it started; ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _current_rss_bytes():
+    # Resident pages right now; the high-water mark where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return _rss_high_water_bytes()
+
+
+def _process_cpu_seconds():
+    # User + system time of every thread of this process and of its children that have exited
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds, count=1):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += count
+        self.sum += seconds * count
+        self.count += count
+
+    def report(self):
+        if not self.count:
+            return None
+        return {"mean_ms": round(self.sum / self.count * 1000, 3),
+                "le": [*LATENCY_BUCKETS, "+Inf"], "counts": list(self.bucket_counts)}
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.overlapped_calls = 0
+        self.peak_rss = 0
+        # Measured article by article (timed_items) vs. batch wall time divided by its articles
+        self.article_latency = _Histogram()
+        self.amortised_latency = _Histogram()
+
+
+def timed_items(items):
+    """Yields `items` unchanged, recording per-article latency for the active stage.
+
+    Each item's latency is the time spent producing it plus the time the
+    caller spends on it before asking for the next one, so it works both for
+    lists consumed in a loop and for lazy pipelines such as nlp.pipe. Outside a
+    PipelineMetrics stage it adds nothing but the generator.
+    """
+    observations = getattr(_active, "observations", None)
+    if observations is None:
+        yield from items
+        return
+    last = time.perf_counter()
+    for item in items:
+        yield item
+        now = time.perf_counter()
+        observations.append(now - last)
+        last = now
+
+
+class PipelineMetrics:
+    """Per-stage performance counters for the enrichment pipeline.
+
+    Every stage call records wall time, the number of articles, CPU time and
+    peak RSS. CPU time is the change in getrusage of the whole process (all
+    threads, so torch and BLAS threads count) plus its exited children; pool
+    workers that outlive the stage are not included. When stages overlap,
+    as under StageScheduler, each one's CPU delta also contains the others'
+    work, so such calls are counted as overlapped and their CPU figures are
+    approximate. Peak RSS is the highest resident size of this process
+    sampled every RSS_SAMPLE_INTERVAL seconds while the stage ran.
+    Per-article latencies are measured where a stage uses `timed_items`; for
+    fully batched stages, or shards run in worker processes, only the
+    amortised batch latency (batch wall time over its articles) is known and
+    is kept in a separate histogram.
+
+    `profile_stage` names one stage to profile, with cProfile (a .prof file
+    for snakeviz/pstats) or, if installed, py-spy attached to this process
+    and its children (a flame graph SVG).
+    """
+
+    def __init__(self, profile_stage=None, profiler="cprofile", profile_dir=METRICS_DIR):
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.started = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._profile = None
+        # Stage calls in progress, each {"peak_rss": ..., "overlapped": ...}
+        self._running = []
+        self._sampler = None
+
+    def _sample_rss(self):
+        # Background thread: raises the peak RSS of every running stage call
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL)
+            rss = _current_rss_bytes()
+            with self._lock:
+                for call in self._running:
+                    call["peak_rss"] = max(call["peak_rss"], rss)
+
+    @contextmanager
+    def stage(self, name, items):
+        _active.observations = observations = []
+        profiling = self._profiling(name) if name == self.profile_stage else nullcontext()
+        call = {"peak_rss": _current_rss_bytes(), "overlapped": False}
+        with self._lock:
+            if self._running:
+                call["overlapped"] = True
+                for other in self._running:
+                    other["overlapped"] = True
+            self._running.append(call)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+                self._sampler.start()
+        start_wall = time.perf_counter()
+        start_cpu = _process_cpu_seconds()
+        try:
+            with profiling:
+                yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = _process_cpu_seconds() - start_cpu
+            rss = _current_rss_bytes()
+            _active.observations = None
+            with self._lock:
+                self._running.remove(call)
+                stats = self._stats.setdefault(name, _StageStats())
+                stats.calls += 1
+                stats.items += items
+                stats.wall += wall
+                stats.cpu += cpu
+                stats.overlapped_calls += call["overlapped"]
+                stats.peak_rss = max(stats.peak_rss, call["peak_rss"], rss)
+                if observations:
+                    for seconds in observations:
+                        stats.article_latency.observe(seconds)
+                elif items:
+                    stats.amortised_latency.observe(wall / items, items)
+
+    @contextmanager
+    def _profiling(self, name):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profiler == "py-spy":
+            if shutil.which("py-spy") is None:
+                logging.warning("py-spy not found on PATH, profiling with cProfile instead.")
+            else:
+                output = os.path.join(self.profile_dir, f"{name}-{int(time.time())}.svg")
+                process = subprocess.Popen(["py-spy", "record", "--pid", str(os.getpid()), "--subprocesses",
+                                            "--output", output])
+                try:
+                    yield
+                finally:
+                    process.send_signal(signal.SIGINT)
+                    process.wait()
+                    logging.info(f"py-spy profile of stage {name} saved to {output}.")
+                return
+        # One profile accumulated over every call of the stage
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            output = os.path.join(self.profile_dir, f"{name}.prof")
+            self._profile.dump_stats(output)
+            logging.info(f"cProfile stats of stage {name} saved to {output}.")
+
+    def report(self):
+        stages = {}
+        with self._lock:
+            for name, stats in self._stats.items():
+                stages[name] = {
+                    "calls": stats.calls,
+                    "items": stats.items,
+                    "wall_sec": round(stats.wall, 3),
+                    "cpu_sec": round(stats.cpu, 3),
+                    "items_per_sec": round(stats.items / stats.wall, 2) if stats.wall else None,
+                    "cpu_overlapped_calls": stats.overlapped_calls,
+                    "peak_rss_mb": round(stats.peak_rss / 2 ** 20, 1),
+                    "article_latency": stats.article_latency.report(),
+                    "amortised_batch_latency": stats.amortised_latency.report(),
+                }
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "total_wall_sec": round(time.time() - self.started, 3),
+            "process_rss_high_water_mb": round(_rss_high_water_bytes() / 2 ** 20, 1),
+            "stages": stages,
+        }
+
+    def prometheus(self):
+        # Prometheus text exposition format, e.g. for the node_exporter textfile collector
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        with self._lock:
+            stats = sorted(self._stats.items())
+            metric("nlp_stage_items_total", "counter", "Articles processed by the stage.",
+                   [f'nlp_stage_items_total{{stage="{n}"}} {s.items}' for n, s in stats])
+            metric("nlp_stage_wall_seconds_total", "counter", "Wall time spent in the stage.",
+                   [f'nlp_stage_wall_seconds_total{{stage="{n}"}} {s.wall:.6f}' for n, s in stats])
+            metric("nlp_stage_cpu_seconds_total", "counter",
+                   "Process CPU time (all threads and exited children) during the stage; approximate for "
+                   "calls overlapping other stages.",
+                   [f'nlp_stage_cpu_seconds_total{{stage="{n}"}} {s.cpu:.6f}' for n, s in stats])
+            metric("nlp_stage_overlapped_calls_total", "counter",
+                   "Stage calls that ran alongside another stage, so their CPU time includes its work.",
+                   [f'nlp_stage_overlapped_calls_total{{stage="{n}"}} {s.overlapped_calls}' for n, s in stats])
+            metric("nlp_stage_items_per_second", "gauge", "Stage throughput over the run.",
+                   [f'nlp_stage_items_per_second{{stage="{n}"}} {s.items / s.wall if s.wall else 0:.3f}'
+                    for n, s in stats])
+            metric("nlp_stage_peak_rss_bytes", "gauge", "Highest sampled RSS of the process while the stage ran.",
+                   [f'nlp_stage_peak_rss_bytes{{stage="{n}"}} {s.peak_rss}' for n, s in stats])
+            for name, attribute, help_text in (
+                    ("nlp_article_latency_seconds", "article_latency", "Measured per-article latency of the stage."),
+                    ("nlp_amortised_article_latency_seconds", "amortised_latency",
+                     "Batch wall time divided evenly over its articles, for stages without per-article timing.")):
+                samples = []
+                for n, s in stats:
+                    histogram = getattr(s, attribute)
+                    if not histogram.count:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], histogram.bucket_counts):
+                        cumulative += count
+                        samples.append(f'{name}_bucket{{stage="{n}",le="{bound}"}} {cumulative}')
+                    samples.append(f'{name}_sum{{stage="{n}"}} {histogram.sum:.6f}')
+                    samples.append(f'{name}_count{{stage="{n}"}} {histogram.count}')
+                metric(name, "histogram", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory=METRICS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, "enrichment_metrics.json")
+        prom_path = os.path.join(directory, "enrichment_metrics.prom")
+        for path, content in ((json_path, json.dumps(self.report(), indent=2)), (prom_path, self.prometheus())):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return json_path, prom_path
+
+
+def stage_timer(metrics, name, items):
+    # Context manager timing one stage call; does nothing without a PipelineMetrics
+    return metrics.stage(name, items) if metrics is not None else nullcontext()
@@ -0,0 +1,27 @@
+# run_history.py
+# JSON run histories shared by the benchmarks and the online topic model.
+import json
+import os
+import subprocess
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_run(path, record):
+    """Appends `record` to the JSON list in `path`, creating the file if needed."""
+    history = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            history = json.load(f)
+    history.append(record)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
@@ -1,12 +1,22 @@
 import requests
-from bs4 import BeautifulSoup
-import time
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+import lxml.html
 from datetime import datetime
 import re
+import time
 import os
-import pandas as pd
+import argparse
+import threading
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from crawl_control import CrawlController, CONNECT_TIMEOUT, READ_TIMEOUT
+from url_index import UrlIndex, URL_INDEX_PATH
+from html_cache import HtmlCache, HTML_CACHE_DIR, LISTING_MAX_AGE_DAYS
 
 # Headers for simulating a browser
 HEADERS = {
@@ -17,131 +27,603 @@ HEADERS = {
 BASE_URL = 'https://www.bbc.co.uk'
 SECTION_URL = 'https://www.bbc.co.uk/news/world'
 
-def parse_article(url):
+MAX_PAGES = 49
+
+# Concurrency of the crawl: total worker threads and in-flight requests per host
+DEFAULT_WORKERS = int(os.getenv("SCRAPER_WORKERS", 8))
+DEFAULT_PER_HOST = int(os.getenv("SCRAPER_PER_HOST", 4))
+
+# HTML extraction backend for article pages, see EXTRACTORS
+PARSER = os.getenv("SCRAPER_PARSER", "bs4-strained")
+
+# Articles per executemany upsert batch
+DEFAULT_BATCH_SIZE = int(os.getenv("SCRAPER_BATCH_SIZE", 100))
+
+EXTRANEOUS_PHRASES = [
+    "Follow the twists and turns",
+    "This video can not be played",
+    "Copyright",
+    "The BBC is not responsible",
+    "Read about our approach"
+]
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    # One keep-alive session shared by all workers, with a connection pool
+    # large enough that no worker has to open a fresh socket.
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter:
+    """Caps the number of in-flight requests to any single host."""
+
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+        return semaphore
+
+
+class Fetcher:
+    """HTTP access shared by the whole crawl: one keep-alive session, a per-host
+    concurrency cap, the adaptive pacing/retry controller and, optionally, the
+    raw HTML cache every successful page is stored in."""
+
+    def __init__(self, pool_size=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, controller=None, cache=None):
+        self.session = make_session(pool_size)
+        self.limiter = HostLimiter(per_host)
+        self.controller = controller or CrawlController()
+        self.cache = cache
+
+    def get(self, url, headers=None):
+        with self.limiter.slot(url):
+            return self.controller.request(self.session, url, headers)
+
+    def store(self, url, html, kind):
+        if self.cache is not None:
+            self.cache.put(url, html, kind)
+
+    def fetch_html(self, url, kind="article"):
+        r = self.get(url)
+        if r is None or r.status_code != 200:
+            return None
+        self.store(url, r.text, kind)
+        return r.text
+
+
+class CachedResponse:
+    def __init__(self, text):
+        self.status_code = 200 if text is not None else 404
+        self.text = text
+        self.headers = {}
+
+
+class OfflineFetcher:
+    """Serves pages from the HTML cache only, so a crawl can be replayed
+    against stored HTML without touching the network."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, url, headers=None):
+        return CachedResponse(self.cache.get(url))
+
+    def store(self, url, html, kind):
+        pass
+
+    def fetch_html(self, url, kind="article"):
+        return self.cache.get(url)
+
+
+_default_fetcher = None
+
+
+def default_fetcher():
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = Fetcher()
+    return _default_fetcher
+
+
+def is_extraneous(text):
+    if text.strip().startswith("Watch:"):
+        return True
+    for phrase in EXTRANEOUS_PHRASES:
+        if phrase in text:
+            return True
+    return False
+
+
+def _article_fields(paragraphs, time_datetime):
+    # Shared tail of every extractor: paragraph texts and the first <time>'s datetime attribute
+    filtered_paragraphs = [p for p in paragraphs if not is_extraneous(p)]
+    text = "\n".join(filtered_paragraphs).strip()
+    if text == "":
+        text = None
+
+    pub_date = None
+    if time_datetime is not None:
+        try:
+            pub_date = datetime.fromisoformat(time_datetime.replace('Z', '+00:00'))
+        except Exception:
+            pub_date = None
+
+    return text, pub_date
+
+
+def _extract_soup(soup):
+    paragraphs = [p.get_text() for p in soup.select('p.ssrcss-1q0x1qg-Paragraph')]
+    time_tag = soup.find('time')
+    time_datetime = time_tag['datetime'] if time_tag and time_tag.has_attr('datetime') else None
+    return _article_fields(paragraphs, time_datetime)
+
+
+def extract_article_bs4(html):
+    # Reference implementation: full html.parser tree
+    return _extract_soup(BeautifulSoup(html, 'html.parser'))
+
+
+_ARTICLE_STRAINER = SoupStrainer(['p', 'time'])
+
+
+def extract_article_bs4_strained(html):
+    # Same parser, but only <p> and <time> subtrees are built
+    return _extract_soup(BeautifulSoup(html, 'html.parser', parse_only=_ARTICLE_STRAINER))
+
+
+_PARAGRAPH_XPATH = "//p[contains(concat(' ', normalize-space(@class), ' '), ' ssrcss-1q0x1qg-Paragraph ')]"
+
+
+def extract_article_lxml(html):
+    # libxml2's C parser; falls back to html.parser on documents it rejects
     try:
-        r = requests.get(url, headers=HEADERS)
-        if r.status_code != 200:
+        root = lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return extract_article_bs4(html)
+    # bs4's get_text() leaves out script, style and template contents; their tails stay
+    lxml.etree.strip_elements(root, 'script', 'style', 'template', with_tail=False)
+    paragraphs = [p.text_content() for p in root.xpath(_PARAGRAPH_XPATH)]
+    time_tag = next(root.iter('time'), None)
+    time_datetime = time_tag.get('datetime') if time_tag is not None else None
+    return _article_fields(paragraphs, time_datetime)
+
+
+EXTRACTORS = {
+    "bs4": extract_article_bs4,
+    "bs4-strained": extract_article_bs4_strained,
+    "lxml": extract_article_lxml,
+}
+
+
+def extract_article(html, parser=None):
+    return EXTRACTORS[parser or PARSER](html)
+
+
+def use_parser(name):
+    global PARSER
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown parser {name!r}, expected one of {sorted(EXTRACTORS)}")
+    PARSER = name
+
+
+def check_parsers(cache, reference="bs4"):
+    # Runs every extractor over the cached article pages, reporting
+    # disagreements with the reference parser and the parse time of each
+    pages = [cache.get(url) for url in cache.urls("article")]
+    results = {}
+    for name, extractor in EXTRACTORS.items():
+        start = time.process_time()
+        results[name] = [extractor(page) for page in pages]
+        elapsed = time.process_time() - start
+        rate = len(pages) / elapsed if elapsed else float("inf")
+        print(f"{name}: {elapsed:.2f}s CPU for {len(pages)} articles ({rate:.1f} articles/sec)")
+    mismatches = {name: sum(a != b for a, b in zip(output, results[reference]))
+                  for name, output in results.items() if name != reference}
+    for name, count in mismatches.items():
+        print(f"{name}: {count} articles differ from {reference}")
+    return mismatches
+
+
+def parse_article(url, fetcher=None):
+    try:
+        html = (fetcher or default_fetcher()).fetch_html(url)
+        if html is None:
             return None, None
-        soup = BeautifulSoup(r.text, 'html.parser')
-        
-        news_paragraphs = soup.select('p.ssrcss-1q0x1qg-Paragraph')
-        
-        def is_extraneous(text):
-            extraneous_phrases = [
-                "Follow the twists and turns",
-                "This video can not be played",
-                "Copyright",
-                "The BBC is not responsible",
-                "Read about our approach"
-            ]
-            if text.strip().startswith("Watch:"):
-                return True
-            for phrase in extraneous_phrases:
-                if phrase in text:
-                    return True
-            return False
-        
-        filtered_paragraphs = [p.get_text() for p in news_paragraphs if not is_extraneous(p.get_text())]
-        text = "\n".join(filtered_paragraphs).strip()
-        if text == "":
-            text = None
-
-        pub_date = None
-        time_tag = soup.find('time')
-        if time_tag and time_tag.has_attr('datetime'):
-            try:
-                pub_date = datetime.fromisoformat(time_tag['datetime'].replace('Z', '+00:00'))
-            except Exception:
-                pub_date = None
-
-        return text, pub_date
+        return extract_article(html)
     except Exception as e:
         print("Error parsing article:", e)
         return None, None
 
-def get_articles_urls(page_num):
+
+def fetch_article(url, fetcher=None, url_index=None):
+    # Like parse_article, but a URL already in url_index is fetched with a
+    # conditional GET; returns None when the server reports it unchanged or
+    # the fetch failed. Failed articles are not stored, so the next
+    # incremental run fetches them again instead of keeping an empty row.
+    if url_index is None:
+        return parse_article(url, fetcher)
+    try:
+        fetcher = fetcher or default_fetcher()
+        headers = url_index.validators(url) if url in url_index else None
+        r = fetcher.get(url, headers)
+        if r is not None and r.status_code == 304:
+            url_index.record(url, r.headers)
+            return None
+        if r is None or r.status_code != 200:
+            print(f"    Fetch of {url} failed, retried on the next run")
+            return None
+        fetcher.store(url, r.text, "article")
+        article_body, article_date = extract_article(r.text)
+        url_index.record(url, r.headers, article_date,
+                         complete=article_body is not None and article_date is not None)
+        return article_body, article_date
+    except Exception as e:
+        print("Error parsing article:", e)
+        return None
+
+
+def extract_listing(html):
+    # Returns (full_url, article_id, headline) for every article promo on a listing page
+    soup = BeautifulSoup(html, 'html.parser')
+    promo_links = soup.select('a.ssrcss-5wtq5v-PromoLink, a.ssrcss-9haqql-LinkPostLink')
+
+    links = []
+    for a in promo_links:
+        href = a.get('href')
+        if href and '/news/articles/' in href:
+            full_url = BASE_URL + href if href.startswith('/') else href
+
+            headline_tag = a.find('span', {'role': 'text'})
+            if headline_tag:
+                headline = headline_tag.get_text(strip=True)
+            else:
+                headline = a.get_text(strip=True)
+            if headline.startswith("Watch:"):
+                headline = headline.replace("Watch:", "").strip()
+            if "published at" in headline:
+                headline = headline.split("published at")[0].strip()
+
+            article_id = href.split('/')[-1]
+            links.append((full_url, article_id, headline))
+    return links
+
+
+def fetch_listing(page_num, fetcher=None):
     url = f"{SECTION_URL}?page={page_num}"
     print(f"Parsing page {page_num}: {url}")
-    articles = []
     try:
-        r = requests.get(url, headers=HEADERS)
-        if r.status_code != 200:
+        html = (fetcher or default_fetcher()).fetch_html(url, "listing")
+        if html is None:
             return []
-        soup = BeautifulSoup(r.text, 'html.parser')
-        promo_links = soup.select('a.ssrcss-5wtq5v-PromoLink, a.ssrcss-9haqql-LinkPostLink')
-
-        for idx, a in enumerate(promo_links, start=1):
-            href = a.get('href')
-            if href and '/news/articles/' in href:
-                full_url = BASE_URL + href if href.startswith('/') else href
-                print(f"{idx}. Scraping {full_url}")
-                print("    Requesting ...")
-                article_body, article_date = parse_article(full_url)
-                print("    Parsing ...")
-
-                headline_tag = a.find('span', {'role': 'text'})
-                if headline_tag:
-                    headline = headline_tag.get_text(strip=True)
-                else:
-                    headline = a.get_text(strip=True)
-                if headline.startswith("Watch:"):
-                    headline = headline.replace("Watch:", "").strip()
-                if "published at" in headline:
-                    headline = headline.split("published at")[0].strip()
-
-                article_id = href.split('/')[-1]
-                saved_path = f"/articles/{article_id}.html"
-                print(f"    Saved in {saved_path}")
-
-                articles.append((full_url, article_date, headline, article_body))
-        return articles
+        return extract_listing(html)
     except Exception as e:
         print("Error retrieving URLs:", e)
         return []
 
+
+def plan_page(links, url_index=None):
+    # Picks the listing links worth fetching and tells whether all of them were already known
+    if url_index is None:
+        return links, False
+    to_fetch = [link for link in links if url_index.needs_recheck(link[0])]
+    return to_fetch, all(url_index.is_complete(link[0]) for link in links)
+
+
+def _fetch_serial(links, fetcher=None, url_index=None):
+    articles = []
+    for idx, (full_url, article_id, headline) in enumerate(links, start=1):
+        print(f"{idx}. Scraping {full_url}")
+        print("    Requesting ...")
+        fetched = fetch_article(full_url, fetcher, url_index)
+        if fetched is None:
+            print("    Not modified or not fetched")
+            continue
+        article_body, article_date = fetched
+        print("    Parsing ...")
+
+        cache = getattr(fetcher, "cache", None)
+        if cache is not None and full_url in cache:
+            print(f"    Saved in {cache.path(full_url)}")
+
+        articles.append((full_url, article_date, headline, article_body))
+    return articles
+
+
+def get_articles_urls(page_num, fetcher=None, url_index=None):
+    links, _ = plan_page(fetch_listing(page_num, fetcher), url_index)
+    return _fetch_serial(links, fetcher, url_index)
+
+
+def crawl_serial(max_pages=MAX_PAGES, controller=None, url_index=None, cache=None, fetcher=None):
+    # One request at a time; pacing between requests is left to the controller
+    fetcher = fetcher or Fetcher(1, 1, controller, cache)
+    for page in range(1, max_pages + 1):
+        links = fetch_listing(page, fetcher)
+        if not links:
+            break
+        to_fetch, all_known = plan_page(links, url_index)
+        yield _fetch_serial(to_fetch, fetcher, url_index)
+        if all_known:
+            print(f"Page {page} only lists known articles, stopping.")
+            break
+
+
+def _collect_page(page_num, submitted):
+    articles = []
+    for (full_url, article_id, headline), future in submitted:
+        fetched = future.result()
+        if fetched is None:
+            continue
+        article_body, article_date = fetched
+        articles.append((full_url, article_date, headline, article_body))
+    print(f"Page {page_num}: scraped {len(articles)} articles")
+    return articles
+
+
+def crawl_concurrent(max_pages=MAX_PAGES, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, controller=None,
+                     url_index=None, cache=None, fetcher=None):
+    """Yields the articles of each listing page, in page order.
+
+    Listing pages are prefetched `workers` pages ahead and their articles are
+    fetched in parallel over one shared keep-alive session, with at most
+    `per_host` requests in flight to any host. Paging stops at the first
+    listing page without articles, as in the serial crawl. With a `url_index`
+    only new or re-checkable articles are fetched, and paging also stops at the
+    first listing page made up entirely of known articles.
+    """
+    fetcher = fetcher or Fetcher(workers, per_host, controller, cache)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        listings = deque()
+        next_page = 1
+
+        def submit_listing():
+            nonlocal next_page
+            listings.append((next_page, pool.submit(fetch_listing, next_page, fetcher)))
+            next_page += 1
+
+        while next_page <= min(workers, max_pages):
+            submit_listing()
+
+        in_flight = deque()
+        while listings:
+            page_num, listing = listings.popleft()
+            links = listing.result()
+            if not links:
+                for _, pending in listings:
+                    pending.cancel()
+                break
+
+            to_fetch, all_known = plan_page(links, url_index)
+            submitted = [(link, pool.submit(fetch_article, link[0], fetcher, url_index)) for link in to_fetch]
+            in_flight.append((page_num, submitted))
+            if all_known:
+                print(f"Page {page_num} only lists known articles, stopping.")
+                for _, pending in listings:
+                    pending.cancel()
+                break
+            if next_page <= max_pages:
+                submit_listing()
+
+            # Hand back finished pages while the next one is still downloading
+            while len(in_flight) > 1:
+                yield _collect_page(*in_flight.popleft())
+
+        while in_flight:
+            yield _collect_page(*in_flight.popleft())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape BBC World news articles into the articles table.")
+    parser.add_argument("--pages", type=int, default=MAX_PAGES,
+                        help="Maximum number of listing pages to crawl.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent fetches; 1 runs the original serial crawl.")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help="Maximum in-flight requests per host.")
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT,
+                        help="Seconds to wait for a connection to be established.")
+    parser.add_argument("--read-timeout", type=float, default=READ_TIMEOUT,
+                        help="Seconds to wait for the server to send data.")
+    parser.add_argument("--max-retries", type=int, default=4,
+                        help="Retries per request on timeouts, 429 and 5xx responses.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip articles already stored and stop at the first page of known articles.")
+    parser.add_argument("--url-index", default=URL_INDEX_PATH,
+                        help="Local index of known article URLs and their HTTP validators.")
+    parser.add_argument("--recheck-hours", type=float, default=12,
+                        help="Minimum hours between conditional re-checks of a known article.")
+    parser.add_argument("--recheck-days", type=float, default=2,
+                        help="Only articles published within this many days are re-checked.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Articles per upsert batch written during the crawl.")
+    parser.add_argument("--cache-dir", default=HTML_CACHE_DIR,
+                        help="Directory of the compressed raw HTML cache.")
+    parser.add_argument("--listing-max-age-days", type=float, default=LISTING_MAX_AGE_DAYS,
+                        help="Older cached versions of listing pages are deleted after the crawl.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not store raw HTML of fetched pages.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Rebuild articles from the HTML cache without any network access.")
+    parser.add_argument("--parser", choices=sorted(EXTRACTORS), default=PARSER,
+                        help="HTML extraction backend for article pages.")
+    parser.add_argument("--check-parsers", action="store_true",
+                        help="Compare all extraction backends on the cached articles and exit.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Enrich articles with nlp_enriched_news while crawling.")
+    parser.add_argument("--stream-batch-size", type=int, default=32,
+                        help="Articles per enrichment micro-batch in --stream mode.")
+    parser.add_argument("--stream-queue-size", type=int, default=64,
+                        help="Articles that may wait for enrichment before the crawl blocks.")
+    return parser.parse_args()
+
+
+UPSERT_ARTICLE = text("""
+    INSERT INTO articles (URL, Date_scraped, Headline, Body)
+    VALUES (:url, :date, :headline, :body)
+    ON DUPLICATE KEY UPDATE Headline = VALUES(Headline), Body = VALUES(Body);
+""")
+
+
+class ArticleWriter:
+    """Streams scraped articles into the articles table in upsert batches.
+
+    Articles are buffered until `batch_size` of them are waiting and then sent
+    as one executemany call in its own transaction, so a crash loses at most
+    the current batch and memory does not grow with the crawl.
+    """
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.rows = 0
+        self.batches = 0
+        self.insert_time = 0.0
+        self._buffer = []
+
+    def add(self, article):
+        url, date, headline, body = article
+        self._buffer.append({"url": url, "date": date, "headline": headline, "body": body})
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, articles):
+        for article in articles:
+            self.add(article)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(UPSERT_ARTICLE, self._buffer)
+        self.insert_time += time.perf_counter() - start
+        self.rows += len(self._buffer)
+        self.batches += 1
+        self._buffer = []
+
+    def rows_per_sec(self):
+        return self.rows / self.insert_time if self.insert_time else 0.0
+
+
+def stream_articles(pages, article_queue, consumer):
+    # Pushes every scraped article onto the enrichment queue as its page
+    # completes. put() blocks while the queue is full, so a slow consumer
+    # throttles the crawl instead of letting articles pile up in memory.
+    # If the consumer dies, the crawl and the MySQL writes go on unstreamed.
+    streaming = True
+    for arts in pages:
+        for article in arts:
+            while streaming:
+                if not consumer.is_alive():
+                    streaming = False
+                    print("Enrichment consumer stopped (see its traceback above); continuing the crawl "
+                          "without streaming. Enrich the remaining articles with python nlp_enriched_news.py.")
+                    break
+                try:
+                    article_queue.put(article, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+        yield arts
+
+
+def make_engine():
+    db_user = os.getenv('DB_USER')
+    db_pass = os.getenv('DB_PASSWORD')
+    db_host = os.getenv('DB_HOST')
+    db_name = os.getenv('DB_NAME')
+
+    # Creating connection via SQLAlchemy
+    return create_engine(f"mysql+pymysql://{db_user}:{db_pass}@{db_host}/{db_name}?charset=utf8mb4")
+
+
+def load_known_urls(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT URL, Date_scraped, Body IS NOT NULL FROM articles")).fetchall()
+
+
 def main():
+    args = parse_args()
+    use_parser(args.parser)
+    if args.check_parsers:
+        check_parsers(HtmlCache(args.cache_dir))
+        return
     load_dotenv()
-    all_articles = []
-    
-    for page in range(1, 50):
-        arts = get_articles_urls(page)
-        if not arts:
-            break
-        all_articles.extend(arts)
-        time.sleep(2)
+    engine = make_engine()
+
+    cache = None if args.no_cache and not args.offline else HtmlCache(args.cache_dir)
 
-    if all_articles:
+    url_index = None
+    if args.incremental and not args.offline:
+        url_index = UrlIndex(args.url_index, args.recheck_hours, args.recheck_days)
         try:
-            db_user = os.getenv('DB_USER')
-            db_pass = os.getenv('DB_PASSWORD')
-            db_host = os.getenv('DB_HOST')
-            db_name = os.getenv('DB_NAME')
-
-            # Creating connection via SQLAlchemy
-            engine = create_engine(f"mysql+pymysql://{db_user}:{db_pass}@{db_host}/{db_name}?charset=utf8mb4")
-
-            df = pd.DataFrame(all_articles, columns=["URL", "Date_scraped", "Headline", "Body"])
-
-            # Upsert insertion
-            with engine.begin() as conn:
-                for _, row in df.iterrows():
-                    stmt = text("""
-                        INSERT INTO articles (URL, Date_scraped, Headline, Body)
-                        VALUES (:url, :date, :headline, :body)
-                        ON DUPLICATE KEY UPDATE Headline = VALUES(Headline), Body = VALUES(Body);
-                    """)
-                    conn.execute(stmt, {
-                        "url": row.URL,
-                        "date": row.Date_scraped,
-                        "headline": row.Headline,
-                        "body": row.Body
-                    })
-
-            print(f"✅ Updated {len(df)} records.")
+            url_index.add_known(load_known_urls(engine))
         except Exception as db_err:
-            print("Error working with the database via SQLAlchemy:", db_err)
+            print("Could not load known URLs from the database:", db_err)
+        print(f"Incremental crawl: {len(url_index)} known articles.")
+
+    controller = CrawlController(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                                 max_retries=args.max_retries)
+    if args.offline:
+        print(f"Offline mode: re-parsing {len(cache)} cached pages from {args.cache_dir}")
+        pages = crawl_serial(args.pages, fetcher=OfflineFetcher(cache))
+    elif args.workers <= 1:
+        pages = crawl_serial(args.pages, controller, url_index, cache)
+    else:
+        pages = crawl_concurrent(args.pages, args.workers, args.per_host, controller, url_index, cache)
+    consumer = None
+    if args.stream:
+        # Imported here: loading the NLP models is only worth it when streaming
+        import nlp_enriched_news
+        article_queue = queue.Queue(maxsize=args.stream_queue_size)
+        consumer = threading.Thread(target=nlp_enriched_news.consume_stream,
+                                    args=(article_queue, args.stream_batch_size), name="enrichment")
+        consumer.start()
+        pages = stream_articles(pages, article_queue, consumer)
+
+    writer = ArticleWriter(engine, args.batch_size)
+    start_time = time.perf_counter()
+    try:
+        for arts in pages:
+            writer.add_many(arts)
+        writer.flush()
+    except Exception as db_err:
+        print("Error working with the database via SQLAlchemy:", db_err)
+        return
+    finally:
+        for host, host_stats in controller.stats().items():
+            print(f"{host}: {host_stats}")
+        if consumer is not None:
+            if consumer.is_alive():
+                article_queue.put(None)
+            consumer.join()
+    print(f"Crawl finished in {time.perf_counter() - start_time:.2f} sec.")
+
+    # Saved even when nothing changed: re-check times and validators of 304 answers are kept
+    if url_index is not None:
+        url_index.save()
+    if cache is not None and not args.offline:
+        freed = cache.prune_listings(args.listing_max_age_days)
+        if freed:
+            print(f"Pruned {freed:.1f} MB of old listing pages from {args.cache_dir}.")
+    if writer.rows:
+        print(f"✅ Updated {writer.rows} records in {writer.batches} batches "
+              f"({writer.rows_per_sec():.1f} rows/sec insert rate).")
     else:
         print("No new data to add.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
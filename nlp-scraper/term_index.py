@@ -0,0 +1,131 @@
+# term_index.py
+# Persistent term counts per day, for top/trending words over any date window
+# without re-reading the corpus.
+#
+#   python term_index.py --window 7d --top 10
+import argparse
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+from datetime import date, timedelta
+
+from sklearn.feature_extraction.text import CountVectorizer
+
+TERM_INDEX_PATH = os.getenv("TERM_INDEX_PATH", "results/term_index.sqlite")
+
+
+def article_day(value):
+    # "2025-05-29" from a datetime, Timestamp or ISO string
+    return str(value)[:10]
+
+
+def window_bounds(window, today=None):
+    """(first_day, last_day) of a window: "today", "<N>d" for the last N days, or "all"."""
+    today = today or date.today()
+    if window == "all":
+        return None, None
+    if window == "today":
+        return today.isoformat(), today.isoformat()
+    match = re.fullmatch(r"(\d+)d", window)
+    if not match:
+        raise ValueError(f"Unknown window {window!r}, expected 'today', '<N>d' or 'all'.")
+    return (today - timedelta(days=int(match.group(1)) - 1)).isoformat(), today.isoformat()
+
+
+class TermIndex:
+    """Term frequencies of the preprocessed articles, bucketed by day.
+
+    term_counts holds one row per (day, term); indexed_articles remembers the
+    content hash and the term counts each article contributed, so an update
+    only tokenizes new or changed articles, and a changed article's old counts
+    are subtracted before its new ones are added. Tokens are the ones
+    CountVectorizer would count.
+    """
+
+    def __init__(self, path=TERM_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS term_counts "
+                              "(day TEXT NOT NULL, term TEXT NOT NULL, count INTEGER NOT NULL, "
+                              "PRIMARY KEY (day, term))")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS indexed_articles "
+                              "(article_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL, "
+                              "day TEXT NOT NULL, terms TEXT NOT NULL)")
+        self._analyzer = CountVectorizer().build_analyzer()
+
+    def _add_counts(self, day, counts, sign=1):
+        self.conn.executemany(
+            "INSERT INTO term_counts (day, term, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, term) DO UPDATE SET count = count + excluded.count",
+            [(day, term, sign * count) for term, count in counts.items()])
+
+    def update(self, articles):
+        """Indexes (article_id, content_hash, date, preprocessed_text) tuples.
+
+        Returns the number of articles that were new or changed.
+        """
+        articles = list(articles)
+        stored = {}
+        ids = [int(article[0]) for article in articles]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.conn.execute("SELECT article_id, content_hash, day, terms FROM indexed_articles "
+                                     f"WHERE article_id IN ({','.join('?' * len(chunk))})", chunk)
+            stored.update((row[0], row[1:]) for row in rows)
+
+        updated = 0
+        with self.conn:
+            for article_id, digest, published, text in articles:
+                article_id = int(article_id)
+                previous = stored.get(article_id)
+                if previous is not None and previous[0] == digest:
+                    continue
+                if previous is not None:
+                    self._add_counts(previous[1], json.loads(previous[2]), sign=-1)
+                day = article_day(published)
+                counts = Counter(self._analyzer(text if isinstance(text, str) else ""))
+                self._add_counts(day, counts)
+                self.conn.execute("INSERT OR REPLACE INTO indexed_articles (article_id, content_hash, day, terms) "
+                                  "VALUES (?, ?, ?, ?)", (article_id, digest, day, json.dumps(counts)))
+                updated += 1
+            if updated:
+                self.conn.execute("DELETE FROM term_counts WHERE count <= 0")
+        return updated
+
+    def top_terms(self, k=10, window="all", today=None):
+        first, last = window_bounds(window, today)
+        query = "SELECT term, SUM(count) AS total FROM term_counts"
+        params = []
+        if first is not None:
+            query += " WHERE day BETWEEN ? AND ?"
+            params = [first, last]
+        query += " GROUP BY term ORDER BY total DESC, term LIMIT ?"
+        return self.conn.execute(query, params + [k]).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Top terms of the enriched articles over a date window.")
+    parser.add_argument("--window", default="all", help="'today', '<N>d' (e.g. 7d) or 'all'.")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--index", default=TERM_INDEX_PATH)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = TermIndex(args.index)
+    for term, count in index.top_terms(args.top, args.window):
+        print(f"{term}: {count}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,42 @@
 # text_utils.py
+import os
 import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 from nltk.tokenize import word_tokenize, sent_tokenize
 
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-
-stop_words = set(stopwords.words('english'))
 stemmer = PorterStemmer()
 
+# --- preprocess_many: distinct word types whose stems are kept, worker processes ---
+STEM_CACHE_SIZE = int(os.getenv("STEM_CACHE_SIZE", 200000))
+PREPROCESS_PROCESSES = int(os.getenv("PREPROCESS_PROCESSES", 1))
+
+# The only rules of NLTK's word tokenizer that still apply once clean_text has
+# removed punctuation: these words are split in two
+_SPLIT_WORDS = {"cannot": ("can", "not"), "gimme": ("gim", "me"), "gonna": ("gon", "na"),
+                "gotta": ("got", "ta"), "lemme": ("lem", "me"), "wanna": ("wan", "na")}
+
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    # NLTK data is fetched on first use rather than at import
+    nltk.download('punkt', quiet=True)
+    nltk.download('stopwords', quiet=True)
+    return frozenset(stopwords.words('english'))
+
 def clean_text(text):
     return re.sub(r"[^\w\s]", "", text.lower())
 
 def tokenize_words(text):
+    get_stop_words()
     return word_tokenize(text)
 
 def remove_stopwords(words):
+    stop_words = get_stop_words()
     return [w for w in words if w not in stop_words]
 
 def stem_words(words):
@@ -28,4 +47,47 @@ def preprocess(text):
     words = tokenize_words(text)
     words = remove_stopwords(words)
     words = stem_words(words)
-    return " ".join(words)
\ No newline at end of file
+    return " ".join(words)
+
+
+# ---------- BATCH PREPROCESSING ----------
+
+def fast_tokenize(text):
+    # word_tokenize for text that went through clean_text, without the regex passes
+    words = []
+    for word in text.split():
+        split = _SPLIT_WORDS.get(word)
+        if split:
+            words.extend(split)
+        else:
+            words.append(word)
+    return words
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def cached_stem(word):
+    return stemmer.stem(word)
+
+
+def _preprocess_chunk(texts):
+    stop_words = get_stop_words()
+    return [" ".join(cached_stem(w) for w in fast_tokenize(clean_text(text)) if w not in stop_words)
+            for text in texts]
+
+
+def preprocess_many(texts, processes=PREPROCESS_PROCESSES, chunk_size=256):
+    """preprocess over many texts, with identical output.
+
+    Tokenizing is a plain split (see fast_tokenize) and stems are memoized per
+    word type, so each distinct word is stemmed once per process. With more
+    than one process, inputs larger than a chunk are spread over a process
+    pool in chunks of `chunk_size` texts.
+    """
+    texts = list(texts)
+    if processes <= 1 or len(texts) <= chunk_size:
+        return _preprocess_chunk(texts)
+    # Fetch NLTK data here once rather than in every worker
+    get_stop_words()
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return [text for chunk in pool.map(_preprocess_chunk, chunks) for text in chunk]
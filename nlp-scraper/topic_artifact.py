@@ -0,0 +1,162 @@
+# topic_artifact.py
+import hashlib
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+TOPIC_ARTIFACT_DIR = os.getenv("TOPIC_ARTIFACT_DIR", "results/topic_artifact")
+
+
+def term_hash(term):
+    # 64 bits from two C checksums; much cheaper per n-gram than a cryptographic hash
+    data = term.encode("utf-8")
+    return (zlib.crc32(data) << 32) | zlib.adler32(data)
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def export_artifact(pipeline, directory=TOPIC_ARTIFACT_DIR, source_path=None):
+    """Writes a fitted TF-IDF + linear classifier pipeline as plain arrays.
+
+    The vocabulary becomes a sorted array of 64-bit term hashes with the
+    matching column numbers, next to the IDF weights, the weight matrix
+    (features x classes), intercepts and class labels. TopicArtifact loads
+    them memory-mapped. `source_path`, the pickle the pipeline was saved to,
+    is recorded with its hash so the artifact is only used in its place.
+    """
+    vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[-1][1]
+    options = {"analyzer": vectorizer.analyzer, "tokenizer": vectorizer.tokenizer,
+               "preprocessor": vectorizer.preprocessor, "stop_words": vectorizer.stop_words,
+               "strip_accents": vectorizer.strip_accents}
+    unsupported = {name: value for name, value in options.items() if value not in (None, "word")}
+    if unsupported:
+        raise ValueError(f"Vectorizer options not supported by the artifact: {unsupported}")
+
+    terms = list(vectorizer.vocabulary_)
+    hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+    columns = np.array([vectorizer.vocabulary_[term] for term in terms], dtype=np.int32)
+    order = np.argsort(hashes)
+    hashes, columns = hashes[order], columns[order]
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("Term hash collision in the vocabulary.")
+
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        "term_hashes": hashes,
+        "term_columns": columns,
+        "idf": np.asarray(vectorizer.idf_, dtype=np.float64) if vectorizer.use_idf else None,
+        "weights": np.ascontiguousarray(classifier.coef_.T, dtype=np.float64),
+        "intercept": np.asarray(classifier.intercept_, dtype=np.float64),
+    }
+    for name, array in arrays.items():
+        if array is not None:
+            np.save(os.path.join(directory, name + ".npy"), array)
+    meta = {
+        "classes": [str(label) for label in classifier.classes_],
+        "n_features": len(terms),
+        "lowercase": vectorizer.lowercase,
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "binary": vectorizer.binary,
+        "sublinear_tf": vectorizer.sublinear_tf,
+        "use_idf": vectorizer.use_idf,
+        "norm": vectorizer.norm,
+    }
+    if source_path is not None:
+        meta["source"] = {"path": os.path.abspath(source_path), "sha1": file_sha1(source_path)}
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return directory
+
+
+def artifact_matches(model_path, directory=TOPIC_ARTIFACT_DIR):
+    """Whether the artifact in `directory` was exported from the model pickle at `model_path`.
+
+    The recorded path must be `model_path`, and the pickle, if it is still
+    there, must be unchanged since the export.
+    """
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, encoding="utf-8") as f:
+        source = json.load(f).get("source")
+    if source is None or source["path"] != os.path.abspath(model_path):
+        return False
+    return not os.path.exists(model_path) or file_sha1(model_path) == source["sha1"]
+
+
+class TopicArtifact:
+    """Predictor over an exported artifact, giving the same labels as the pipeline.
+
+    Arrays are opened with mmap_mode="r", so processes loading the same
+    artifact share its pages instead of unpickling private copies.
+    """
+
+    def __init__(self, directory=TOPIC_ARTIFACT_DIR):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+        self.term_hashes = load("term_hashes")
+        self.term_columns = load("term_columns")
+        self.idf = load("idf") if self.meta["use_idf"] else None
+        self.weights = load("weights")
+        self.intercept = load("intercept")
+        self.classes_ = np.array(self.meta["classes"], dtype=object)
+        self._token = re.compile(self.meta["token_pattern"])
+
+    def _ngrams(self, text):
+        # Same n-grams as sklearn's word analyzer
+        if self.meta["lowercase"]:
+            text = text.lower()
+        tokens = self._token.findall(text)
+        low, high = self.meta["ngram_range"]
+        grams = list(tokens) if low == 1 else []
+        for n in range(max(low, 2), high + 1):
+            grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def transform(self, texts):
+        texts = list(texts)
+        # Every distinct n-gram of the batch is hashed and looked up once
+        grams = {}
+        rows, gram_ids = [], []
+        for row, text in enumerate(texts):
+            doc_ids = [grams.setdefault(gram, len(grams)) for gram in self._ngrams(text)]
+            gram_ids.extend(doc_ids)
+            rows.extend([row] * len(doc_ids))
+        hashes = np.fromiter((term_hash(gram) for gram in grams), dtype=np.uint64, count=len(grams))
+        positions = np.minimum(np.searchsorted(self.term_hashes, hashes), len(self.term_hashes) - 1)
+        known = self.term_hashes[positions] == hashes
+        gram_columns = np.where(known, self.term_columns[positions], -1)[np.asarray(gram_ids, dtype=np.int64)]
+        found = gram_columns >= 0
+        rows = np.asarray(rows, dtype=np.int64)[found]
+        matrix = csr_matrix((np.ones(len(rows)), (rows, gram_columns[found])),
+                            shape=(len(texts), self.meta["n_features"]))
+        matrix.sum_duplicates()
+        if self.meta["binary"]:
+            matrix.data[:] = 1.0
+        if self.meta["sublinear_tf"]:
+            np.log(matrix.data, matrix.data)
+            matrix.data += 1
+        if self.idf is not None:
+            matrix = matrix.multiply(self.idf).tocsr()
+        if self.meta["norm"]:
+            matrix = normalize(matrix, norm=self.meta["norm"], copy=False)
+        return matrix
+
+    def decision_function(self, texts):
+        return self.transform(texts) @ self.weights + self.intercept
+
+    def predict(self, texts):
+        scores = self.decision_function(texts)
+        if scores.shape[1] == 1:
+            return self.classes_[(scores[:, 0] > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
@@ -1,7 +1,10 @@
+import argparse
+import json
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import learning_curve
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import HalvingGridSearchCV, learning_curve
 from sklearn.svm import LinearSVC
 from sklearn.pipeline import Pipeline
 import numpy as np
@@ -9,87 +12,221 @@ import pickle
 from sklearn.metrics import classification_report, accuracy_score
 import logging
 import time
-from text_utils import preprocess  
+from feature_cache import (FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_MB, CachedVectorizer, clear_feature_cache,
+                           preprocess_cached, prune_feature_cache)
+from topic_artifact import export_artifact, TopicArtifact
 import os
+import shutil
 
 # --- Setup logging ---
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 
-# --- Load training and test data ---
-logging.info("Loading data...")
-try:
-    df_train = pd.read_csv("data/bbc_news_train.csv")
-    df_test = pd.read_csv("data/bbc_news_tests.csv")  
-except FileNotFoundError as e:
-    logging.error(f"File not found: {str(e)}")
-    exit(1)
-
-# --- Preprocess text data with COMMON function ---
-logging.info("Preprocessing training and test texts...")
-X_train = df_train['Text'].apply(preprocess)
-y_train = df_train['Category']
-X_test = df_test['Text'].apply(preprocess)
-y_test = df_test['Category']
-
-# --- Define pipeline: TF-IDF 
-pipeline = Pipeline([
-    ("tfidf", TfidfVectorizer(max_features=10000, ngram_range=(1, 2))),
-    ("clf", LinearSVC(
-    C=0.01,  # Decrease C for stronger regularization (was 0.1)
-    class_weight='balanced',
-    penalty='l2',  # Explicit L2 regularization
-    max_iter=2000  # Ensure convergence
-)
-     
-     
-     )
-])
-
-# --- Train the classifier ---
-logging.info("Training topic classifier...")
-start_time = time.time()
-pipeline.fit(X_train, y_train)
-logging.info(f"Training completed in {time.time() - start_time:.2f} seconds.")
-
-# --- Evaluate on test set ---
-logging.info("Evaluating model on test set...")
-y_pred = pipeline.predict(X_test)
-acc = accuracy_score(y_test, y_pred)
-logging.info(f"Test accuracy: {acc:.4f}")
-logging.info("Classification report:\n" + classification_report(y_test, y_pred))
-
-# --- Save the model and vectorizer ---
-os.makedirs("results", exist_ok=True)
-model_path = "results/topic_classifier.pkl"
-with open(model_path, "wb") as f:
-    pickle.dump(pipeline, f)
-logging.info(f"Model saved to {model_path}")
-
-# --- Save label encoder for mapping ---
-from sklearn.preprocessing import LabelEncoder
-le = LabelEncoder()
-y_encoded = le.fit_transform(y_train)
-label_mapping = dict(zip(le.classes_, le.transform(le.classes_)))
-with open("results/label_encoder.pkl", "wb") as f:
-    pickle.dump(label_mapping, f)
-logging.info("Label mapping saved.")
-
-# --- Generate learning curve ---
-logging.info("Generating learning curves...")
-train_sizes, train_scores, val_scores = learning_curve(
-    pipeline, X_train, y_train, cv=5, scoring='accuracy',
-    train_sizes=np.linspace(0.1, 1.0, 5),  
-    n_jobs=-1
-)
-
-plt.figure(figsize=(10, 6))
-plt.plot(train_sizes, np.mean(train_scores, axis=1), 'o-', label='Training accuracy')
-plt.plot(train_sizes, np.mean(val_scores, axis=1), 'o-', label='Validation accuracy')
-plt.xlabel('Training examples')
-plt.ylabel('Accuracy')
-plt.title('Learning Curves')
-plt.legend()
-plt.grid(True)
-plot_path = "results/learning_curves.png"
-plt.savefig(plot_path, dpi=150)
-logging.info(f"Learning curve saved to {plot_path}")
\ No newline at end of file
+# --- Hyperparameter search space (--search) ---
+SEARCH_SPACE = {
+    "tfidf__vectorizer__max_features": [5000, 10000, 20000, None],
+    "tfidf__vectorizer__ngram_range": [(1, 1), (1, 2)],
+    "clf__C": [0.003, 0.01, 0.03, 0.1, 0.3, 1.0],
+    "clf__class_weight": [None, "balanced"],
+}
+SEARCH_OUTPUT_PATH = "results/topic_search.json"
+
+
+def load_data():
+    # --- Load training and test data ---
+    logging.info("Loading data...")
+    try:
+        df_train = pd.read_csv("data/bbc_news_train.csv")
+        df_test = pd.read_csv("data/bbc_news_tests.csv")
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {str(e)}")
+        exit(1)
+
+    # --- Preprocess text data with COMMON function, cached by text hash ---
+    logging.info("Preprocessing training and test texts...")
+    X_train = preprocess_cached(df_train['Text'])
+    y_train = df_train['Category']
+    X_test = preprocess_cached(df_test['Text'])
+    y_test = df_test['Category']
+    return X_train, y_train, X_test, y_test
+
+
+def build_pipeline():
+    # --- Define pipeline: TF-IDF (fits and features cached on disk) + LinearSVC ---
+    return Pipeline([
+        ("tfidf", CachedVectorizer(TfidfVectorizer(max_features=10000, ngram_range=(1, 2)))),
+        ("clf", LinearSVC(
+            C=0.01,  # Decrease C for stronger regularization (was 0.1)
+            class_weight='balanced',
+            penalty='l2',  # Explicit L2 regularization
+            max_iter=2000  # Ensure convergence
+        ))
+    ])
+
+
+def plain_pipeline(pipeline):
+    # The fitted pipeline without the feature cache, as used for inference
+    return Pipeline([("tfidf", pipeline.named_steps["tfidf"].vectorizer_), ("clf", pipeline.named_steps["clf"])])
+
+
+def train_and_evaluate(pipeline, X_train, y_train, X_test, y_test):
+    # --- Train the classifier ---
+    logging.info("Training topic classifier...")
+    start_time = time.time()
+    pipeline.fit(X_train, y_train)
+    logging.info(f"Training completed in {time.time() - start_time:.2f} seconds.")
+
+    # --- Evaluate on test set ---
+    logging.info("Evaluating model on test set...")
+    y_pred = pipeline.predict(X_test)
+    acc = accuracy_score(y_test, y_pred)
+    logging.info(f"Test accuracy: {acc:.4f}")
+    logging.info("Classification report:\n" + classification_report(y_test, y_pred))
+    return acc
+
+
+def save_model(pipeline, y_train):
+    # --- Save the model and vectorizer ---
+    os.makedirs("results", exist_ok=True)
+    model_path = "results/topic_classifier.pkl"
+    with open(model_path, "wb") as f:
+        pickle.dump(plain_pipeline(pipeline), f)
+    logging.info(f"Model saved to {model_path}")
+
+    # --- Save label encoder for mapping ---
+    from sklearn.preprocessing import LabelEncoder
+    le = LabelEncoder()
+    y_encoded = le.fit_transform(y_train)
+    label_mapping = dict(zip(le.classes_, le.transform(le.classes_)))
+    with open("results/label_encoder.pkl", "wb") as f:
+        pickle.dump(label_mapping, f)
+    logging.info("Label mapping saved.")
+    return model_path
+
+
+def export_inference_artifact(pipeline, X_test, model_path):
+    # --- Export the compact, memory-mapped artifact used for inference ---
+    model = plain_pipeline(pipeline)
+    directory = export_artifact(model, source_path=model_path)
+    if (TopicArtifact(directory).predict(X_test) == model.predict(X_test)).all():
+        logging.info(f"Inference artifact saved to {directory}; predictions match the pipeline.")
+    else:
+        # Removed, so inference falls back to the pickle instead of a wrong artifact
+        shutil.rmtree(directory)
+        logging.error(f"Inference artifact did not reproduce the pipeline's predictions and was deleted; "
+                      f"{model_path} is used instead.")
+
+
+def search_hyperparameters(X_train, y_train, n_jobs=-1, factor=3, output_path=SEARCH_OUTPUT_PATH):
+    """Successive halving over SEARCH_SPACE, writing a leaderboard to JSON.
+
+    Every candidate is first scored with 5-fold CV on a small share of the
+    training set; only the best 1/`factor` advance to the next round, which
+    uses `factor` times more articles. Folds run on `n_jobs` processes, and
+    candidates that differ only in classifier settings reuse the cached
+    TF-IDF fit of their fold.
+    """
+    logging.info("Searching hyperparameters with successive halving...")
+    start_time = time.time()
+    search = HalvingGridSearchCV(build_pipeline(), SEARCH_SPACE, factor=factor, cv=5, scoring='accuracy',
+                                 n_jobs=n_jobs, refit=False, random_state=0)
+    search.fit(X_train, y_train)
+    elapsed = time.time() - start_time
+
+    results = search.cv_results_
+    leaderboard = []
+    for i in range(len(results["params"])):
+        params = {name: list(value) if isinstance(value, tuple) else value
+                  for name, value in results["params"][i].items()}
+        leaderboard.append({
+            "params": params,
+            "iteration": int(results["iter"][i]),
+            "n_resources": int(results["n_resources"][i]),
+            "mean_test_score": round(float(results["mean_test_score"][i]), 4),
+            "std_test_score": round(float(results["std_test_score"][i]), 4),
+            "mean_fit_time": round(float(results["mean_fit_time"][i]), 3),
+            "mean_score_time": round(float(results["mean_score_time"][i]), 3),
+        })
+    # Candidates that survived longest first, then by score
+    leaderboard.sort(key=lambda row: (-row["iteration"], -row["mean_test_score"]))
+    for rank, row in enumerate(leaderboard, start=1):
+        row["rank"] = rank
+
+    report = {
+        "search_time_sec": round(elapsed, 2),
+        "candidates": len(leaderboard),
+        "factor": factor,
+        "best_params": leaderboard[0]["params"],
+        "best_score": leaderboard[0]["mean_test_score"],
+        "leaderboard": leaderboard,
+    }
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Search over {len(leaderboard)} candidates took {elapsed:.2f} seconds.")
+    logging.info(f"Best CV accuracy {report['best_score']:.4f} with {report['best_params']}")
+    logging.info(f"Leaderboard saved to {output_path}")
+    return report
+
+
+def plot_learning_curve(pipeline, X_train, y_train):
+    # --- Generate learning curve ---
+    logging.info("Generating learning curves...")
+    train_sizes, train_scores, val_scores = learning_curve(
+        pipeline, X_train, y_train, cv=5, scoring='accuracy',
+        train_sizes=np.linspace(0.1, 1.0, 5),
+        n_jobs=-1
+    )
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(train_sizes, np.mean(train_scores, axis=1), 'o-', label='Training accuracy')
+    plt.plot(train_sizes, np.mean(val_scores, axis=1), 'o-', label='Validation accuracy')
+    plt.xlabel('Training examples')
+    plt.ylabel('Accuracy')
+    plt.title('Learning Curves')
+    plt.legend()
+    plt.grid(True)
+    plot_path = "results/learning_curves.png"
+    plt.savefig(plot_path, dpi=150)
+    logging.info(f"Learning curve saved to {plot_path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the topic classifier, or search its hyperparameters.")
+    parser.add_argument("--search", action="store_true",
+                        help=f"Run a successive-halving search over SEARCH_SPACE and write {SEARCH_OUTPUT_PATH}.")
+    parser.add_argument("--search-jobs", type=int, default=-1, help="Worker processes for the search (-1: all cores).")
+    parser.add_argument("--search-factor", type=int, default=3,
+                        help="Share of candidates kept (1/factor) and growth of the training share per round.")
+    parser.add_argument("--clear-feature-cache", action="store_true",
+                        help=f"Delete the cached TF-IDF fits and matrices in {FEATURE_CACHE_DIR} first.")
+    parser.add_argument("--feature-cache-max-mb", type=float, default=FEATURE_CACHE_MAX_MB,
+                        help="Least recently used TF-IDF fits are deleted after the run beyond this size.")
+    return parser.parse_args()
+
+
+def trim_feature_cache(max_mb):
+    # --- Keep the TF-IDF cache bounded; a search leaves one fit per fold and candidate ---
+    freed = prune_feature_cache(FEATURE_CACHE_DIR, max_mb)
+    if freed:
+        logging.info(f"Pruned {freed:.1f} MB of least recently used fits from {FEATURE_CACHE_DIR}.")
+
+
+def main():
+    args = parse_args()
+    if args.clear_feature_cache:
+        clear_feature_cache()
+        logging.info(f"Feature cache {FEATURE_CACHE_DIR} cleared.")
+    X_train, y_train, X_test, y_test = load_data()
+    if args.search:
+        search_hyperparameters(X_train, y_train, args.search_jobs, args.search_factor)
+    else:
+        pipeline = build_pipeline()
+        train_and_evaluate(pipeline, X_train, y_train, X_test, y_test)
+        model_path = save_model(pipeline, y_train)
+        export_inference_artifact(pipeline, X_test, model_path)
+        plot_learning_curve(pipeline, X_train, y_train)
+    trim_feature_cache(args.feature_cache_max_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# url_index.py
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+URL_INDEX_PATH = os.getenv("URL_INDEX_PATH", "data/url_index.json")
+
+
+def _utc_naive(dt):
+    if dt is None:
+        return None
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _isoformat(dt):
+    dt = _utc_naive(dt)
+    return dt.isoformat() if dt is not None else None
+
+
+class UrlIndex:
+    """Article URLs already stored, with the HTTP validators of their last fetch.
+
+    Entries map a URL to its publication date, the time it was last checked and
+    the ETag/Last-Modified headers returned then. Recently published articles
+    are re-checked with a conditional GET at most every `recheck_hours`; older
+    ones are considered final and never fetched again.
+    """
+
+    def __init__(self, path=URL_INDEX_PATH, recheck_hours=12, recheck_days=2):
+        self.path = path
+        self.recheck_after = timedelta(hours=recheck_hours)
+        self.recheck_window = timedelta(days=recheck_days)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_known(self, rows):
+        # rows: (url, published, has_body) already stored elsewhere, e.g. in the articles
+        # table; a row without a body or date is incomplete and gets fetched again
+        with self._lock:
+            for url, published, has_body in rows:
+                entry = self._entries.setdefault(url, {"published": _isoformat(published), "checked": None})
+                if published is None or not has_body:
+                    entry["incomplete"] = True
+
+    def is_complete(self, url):
+        # Known with a stored body and date, so it never has to be fetched from scratch
+        entry = self._entries.get(url)
+        return entry is not None and not entry.get("incomplete")
+
+    def needs_recheck(self, url, now=None):
+        entry = self._entries.get(url)
+        if entry is None:
+            return True
+        now = now or datetime.utcnow()
+        checked = entry.get("checked")
+        if entry.get("incomplete"):
+            return checked is None or now - datetime.fromisoformat(checked) >= self.recheck_after
+        if not entry.get("published"):
+            return False
+        if now - datetime.fromisoformat(entry["published"]) > self.recheck_window:
+            return False
+        return checked is None or now - datetime.fromisoformat(checked) >= self.recheck_after
+
+    def validators(self, url):
+        # Conditional request headers for a known URL
+        entry = self._entries.get(url) or {}
+        headers = {}
+        if entry.get("incomplete"):
+            # The stored copy is unusable, so a 304 would not help
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url, response_headers, published=None, complete=None):
+        with self._lock:
+            entry = self._entries.setdefault(url, {"published": None})
+            if published is not None:
+                entry["published"] = _isoformat(published)
+            if complete is not None:
+                if complete:
+                    entry.pop("incomplete", None)
+                else:
+                    entry["incomplete"] = True
+            entry["checked"] = datetime.utcnow().isoformat()
+            entry["etag"] = response_headers.get("ETag") or entry.get("etag")
+            entry["last_modified"] = response_headers.get("Last-Modified") or entry.get("last_modified")
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
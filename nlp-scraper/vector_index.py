@@ -0,0 +1,217 @@
+# vector_index.py
+# Persistent index of article embeddings for semantic search.
+#
+#   python vector_index.py "chemical leak" "toxic spill" --k 20
+import argparse
+import json
+import os
+
+import numpy as np
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "results/vector_index")
+IVF_MIN_TRAIN = int(os.getenv("IVF_MIN_TRAIN", 1000))
+
+
+def unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=10, seed=0):
+    # k-means on unit vectors, with cosine similarity as the closeness measure
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = unit_rows(sums)
+    return centroids
+
+
+class VectorIndex:
+    """Approximate nearest-neighbour index over unit-length article embeddings.
+
+    Vectors are appended to a memory-mapped float32 file, one row per article
+    ID; an article added again has its row overwritten. index.npz is the
+    record of which rows exist: rows appended by a run that stopped before
+    `save` are cut off when the index is next opened. Search is an inverted
+    file (IVF): once IVF_MIN_TRAIN vectors exist, spherical k-means splits them
+    into about sqrt(n) lists, and a query only scores the rows of its `nprobe`
+    closest lists. Smaller indexes are searched exhaustively. New vectors join
+    the list of their nearest centroid, and the lists are retrained when the
+    index has grown fourfold since the last training. Meant for a single
+    writing process.
+    """
+
+    def __init__(self, root=VECTOR_INDEX_DIR):
+        self.root = root
+        self.vectors_path = os.path.join(root, "vectors.f32")
+        self.meta_path = os.path.join(root, "meta.json")
+        self.arrays_path = os.path.join(root, "index.npz")
+        self.dim = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.assignment = np.zeros(0, dtype=np.int32)
+        self.centroids = None
+        self.trained_size = 0
+        self._rows = {}
+        self._vectors = None
+        self._lists = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.trained_size = meta["trained_size"]
+            arrays = np.load(self.arrays_path)
+            self.ids = arrays["ids"]
+            self.assignment = arrays["assignment"]
+            self.centroids = arrays["centroids"] if self.trained_size else None
+            self._rows = {int(article_id): row for row, article_id in enumerate(self.ids)}
+            self._truncate()
+            self._map()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, article_id):
+        return int(article_id) in self._rows
+
+    def _truncate(self):
+        # Drops rows written after the last save, so the next append starts at row len(ids)
+        size = len(self.ids) * self.dim * np.dtype(np.float32).itemsize
+        if os.path.getsize(self.vectors_path) > size:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(size)
+
+    def _map(self):
+        self._vectors = (np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+                         if len(self.ids) else None)
+        self._lists = None
+
+    def _nearest_list(self, vectors):
+        return (vectors @ self.centroids.T).argmax(axis=1).astype(np.int32)
+
+    def _train(self):
+        n_lists = int(np.clip(np.sqrt(len(self.ids)), 1, 4096))
+        rng = np.random.RandomState(0)
+        sample = self._vectors[np.sort(rng.choice(len(self.ids), min(len(self.ids), 50 * n_lists), replace=False))]
+        self.centroids = spherical_kmeans(np.asarray(sample), n_lists)
+        self.assignment = np.concatenate([self._nearest_list(np.asarray(self._vectors[start:start + 65536]))
+                                          for start in range(0, len(self.ids), 65536)])
+        self.trained_size = len(self.ids)
+        self._lists = None
+
+    def add(self, article_ids, vectors):
+        """Adds or replaces the (unit-normalised) embeddings of `article_ids`."""
+        vectors = unit_rows(vectors)
+        if not len(vectors):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            os.makedirs(self.root, exist_ok=True)
+            open(self.vectors_path, "wb").close()
+
+        new_ids, new_rows = [], []
+        for article_id, vector in zip(article_ids, vectors):
+            row = self._rows.get(int(article_id))
+            if row is None:
+                self._rows[int(article_id)] = len(self.ids) + len(new_ids)
+                new_ids.append(int(article_id))
+                new_rows.append(vector)
+            else:
+                self._vectors[row] = vector
+                if self.centroids is not None:
+                    self.assignment[row] = self._nearest_list(vector[None, :])[0]
+        if self._vectors is not None:
+            self._vectors.flush()
+        if new_ids:
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.asarray(new_rows, dtype=np.float32).tobytes())
+            new_rows = np.asarray(new_rows, dtype=np.float32)
+            self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype=np.int64)])
+            if self.centroids is not None:
+                assigned = self._nearest_list(new_rows)
+            else:
+                assigned = np.zeros(len(new_ids), dtype=np.int32)
+            self.assignment = np.concatenate([self.assignment, assigned])
+        self._map()
+        if len(self.ids) >= IVF_MIN_TRAIN and (self.centroids is None or len(self.ids) >= 4 * self.trained_size):
+            self._train()
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignment, kind="stable")
+            bounds = np.searchsorted(self.assignment[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def search(self, queries, k=10, nprobe=8):
+        """Top-k (article_id, cosine similarity) pairs for the query vectors.
+
+        With several queries an article scores its best similarity to any of
+        them, e.g. for a list of keywords.
+        """
+        if not len(self.ids):
+            return []
+        queries = unit_rows(np.atleast_2d(queries))
+        if self.centroids is None:
+            rows = np.arange(len(self.ids))
+        else:
+            order, bounds = self._inverted_lists()
+            probes = np.unique(np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe])
+            rows = np.sort(np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probes]))
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), 65536):
+            block = np.asarray(self._vectors[rows[start:start + 65536]])
+            scores[start:start + 65536] = (block @ queries.T).max(axis=1)
+        top = np.argsort(-scores)[:k]
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in top]
+
+    def save(self):
+        if self.dim is None:
+            return
+        tmp_path = self.arrays_path + ".tmp.npz"
+        np.savez(tmp_path, ids=self.ids, assignment=self.assignment,
+                 centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim), np.float32))
+        os.replace(tmp_path, self.arrays_path)
+        with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": len(self.ids), "trained_size": self.trained_size}, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+
+def similar_articles(query, k=10, nprobe=8, index=None):
+    """Articles most similar to a text or a list of keywords/texts."""
+    import nlp_enriched_news
+    index = index or VectorIndex()
+    texts = [query] if isinstance(query, str) else list(query)
+    embeddings = nlp_enriched_news.get_sentence_model().encode(texts, convert_to_numpy=True,
+                                                                show_progress_bar=False)
+    return index.search(embeddings, k, nprobe)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the articles most similar to a text or keywords.")
+    parser.add_argument("query", nargs="+", help="One text, or several keywords (best match counts).")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists searched; more is slower but more exact.")
+    parser.add_argument("--articles", default="results/enhanced_news.csv", help="CSV used to show headlines.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = similar_articles(args.query if len(args.query) > 1 else args.query[0], args.k, args.nprobe)
+    headlines = {}
+    if os.path.exists(args.articles):
+        import pandas as pd
+        articles = pd.read_csv(args.articles, usecols=["Unique_ID", "Headline"])
+        headlines = dict(zip(articles["Unique_ID"], articles["Headline"]))
+    for article_id, score in results:
+        print(f"{score:.3f}  {article_id}  {headlines.get(article_id, '')}")
+
+
+if __name__ == "__main__":
+    main()